@@ -0,0 +1,90 @@
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.NEAT import *
+from scripts.flappybird import FlappyBirdGame, GenomeBird
+
+
+def setup_game(decision_interval:int, seed:int, gaps) -> FlappyBirdGame:
+    game = FlappyBirdGame(False, gaps=gaps, vectorized=True, seed=seed,
+                          decision_interval=decision_interval)
+
+    # Same start population as TerminalController.setup_empty_bird
+    base_genome = Genome(nodes=[
+        NodeGene(NodeType.Input, OperatorType.Plus, io_index=0),
+        NodeGene(NodeType.Input, OperatorType.Plus, io_index=1),
+        NodeGene(NodeType.Input, OperatorType.Plus, io_index=2),
+        NodeGene(NodeType.Output, OperatorType.Plus),
+        NodeGene(NodeType.Output, OperatorType.Plus),
+    ], connections=[])
+
+    for mutation in connection_mutations(base_genome, 0, 0, rng=game.random):
+        for variant in connection_weight_random_add(mutation, 20, -4, 4, rng=game.random):
+            game.add_bird(GenomeBird(variant, 20, (40, 250)))
+
+    return game
+
+
+def run_training(decision_interval:int, seed:int, gaps, episodes:int, max_score:int):
+    game = setup_game(decision_interval, seed, gaps)
+    delta_time = 1 / game.tick
+
+    ticks = 0
+    bird_ticks = 0
+    scores = []
+
+    start = time.perf_counter()
+    # Reset draws the progress bar, keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(episodes):
+            game.evaluate_population(delta_time)
+
+            ticks += game.tick_count
+            bird_ticks += sum(bird.score for bird in game.birds)
+            scores.append(game.score)
+
+            if game.score > max_score:
+                break
+            game.reset()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ticks_per_sec": ticks / elapsed,
+        "bird_ticks_per_sec": bird_ticks / elapsed,
+        "evaluations_per_sec": game.network_evaluations / elapsed,
+        "best_score": max(scores),
+        "episodes": len(scores),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Trade off of network decision interval against training score")
+    parser.add_argument("--interval", action="append", type=int, default=[])
+    parser.add_argument("--episodes", type=int, default=40)
+    parser.add_argument("--max-score", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gap", action="append", type=int, default=[])
+    args = parser.parse_args()
+
+    intervals = args.interval or [1, 2, 3, 5]
+    gaps = args.gap or [80, 70, 60, 55, 50]
+
+    print(f"{'interval':>8} {'ticks/sec':>12} {'bird ticks/sec':>15} "
+          f"{'evals/sec':>12} {'best score':>11} {'episodes':>9}")
+    for interval in intervals:
+        result = run_training(interval, args.seed, gaps, args.episodes, args.max_score)
+        print(f"{interval:8d} {result['ticks_per_sec']:12.1f} "
+              f"{result['bird_ticks_per_sec']:15.1f} "
+              f"{result['evaluations_per_sec']:12.1f} "
+              f"{result['best_score']:11d} {result['episodes']:9d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from scripts.NEAT import *
+
+
+@dataclass
+class GenomeSize:
+    inputs: int = 16
+    outputs: int = 3
+    hidden: int = 4
+    connections: int = 40
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    ops_per_sec: float
+    peak_memory: int
+
+
+def synthetic_genome(size:GenomeSize, rng:random.Random) -> Genome:
+    nodes = [NodeGene(NodeType.Input, OperatorType.Plus, io_index=i)
+             for i in range(size.inputs)]
+    nodes += [NodeGene(NodeType.Output, rng.choice(list(OperatorType)))
+              for _ in range(size.outputs)]
+    nodes += [NodeGene(NodeType.Hidden, rng.choice(list(OperatorType)))
+              for _ in range(size.hidden)]
+
+    sources = [i for i, node in enumerate(nodes) if node.type != NodeType.Output]
+    destinations = [i for i, node in enumerate(nodes) if node.type != NodeType.Input]
+    pairs = [(source, destination) for source in sources for destination in destinations
+             if source != destination]
+    pairs = rng.sample(pairs, min(size.connections, len(pairs)))
+
+    connections = [ConnectionGene(source, destination, rng.uniform(-4, 4),
+                                  rng.choice(list(OperatorType)))
+                   for source, destination in pairs]
+
+    return Genome(nodes=nodes, connections=connections)
+
+
+# Every benchmark takes the genome size and a seeded rng, and returns a
+# callable running one operation
+BENCHMARKS: Dict[str, Callable[[GenomeSize, random.Random], Callable[[], None]]] = {}
+
+
+def benchmark(name:str):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+@benchmark("genome_feed_data")
+def bench_genome_feed_data(size, rng):
+    genome = synthetic_genome(size, rng)
+    inputs = [rng.uniform(0, 400) for _ in range(size.inputs)]
+    return lambda: genome_feed_data(genome, inputs)
+
+
+@benchmark("compiled_feed")
+def bench_compiled_feed(size, rng):
+    compiled = CompiledGenome(synthetic_genome(size, rng))
+    inputs = [rng.uniform(0, 400) for _ in range(size.inputs)]
+    return lambda: compiled.feed(inputs)
+
+
+@benchmark("batch_feed_1000")
+def bench_batch_feed(size, rng):
+    batch = GenomeBatch([synthetic_genome(size, rng) for _ in range(1000)])
+    inputs = np.random.default_rng(rng.randrange(2 ** 32)).uniform(0, 400, (1000, size.inputs))
+    return lambda: batch.feed(inputs)
+
+
+@benchmark("connection_mutations")
+def bench_connection_mutations(size, rng):
+    genome = synthetic_genome(size, rng)
+    return lambda: connection_mutations(genome, -4, 4)
+
+
+@benchmark("insert_node_mutations")
+def bench_insert_node_mutations(size, rng):
+    genome = synthetic_genome(size, rng)
+    return lambda: insert_node_mutations(genome)
+
+
+@benchmark("sample_mutations")
+def bench_sample_mutations(size, rng):
+    genome = synthetic_genome(size, rng)
+    return lambda: sample_mutations(genome, 10, -4, 4)
+
+
+@benchmark("connection_weight_random_add")
+def bench_connection_weight_random_add(size, rng):
+    genome = synthetic_genome(size, rng)
+    return lambda: connection_weight_random_add(genome, 20, -4, 4)
+
+
+@benchmark("weight_random_add_400")
+def bench_weight_random_add_400(size, rng):
+    # List path of a reset, 20 variants of 20 parents sharing a topology
+    parents = connection_weight_random_add(synthetic_genome(size, rng), 20, -4, 4)
+    return lambda: [connection_weight_random_add(parent, 20, -4, 4) for parent in parents]
+
+
+@benchmark("Population.random_add_400")
+def bench_population_random_add_400(size, rng):
+    population = Population.from_genomes(
+        connection_weight_random_add(synthetic_genome(size, rng), 20, -4, 4))
+    numpy_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    return lambda: population.random_add(20, -4, 4, numpy_rng)
+
+
+@benchmark("Population.random_add_400_genomes")
+def bench_population_random_add_400_genomes(size, rng):
+    # Including turning the rows back into Genome objects
+    population = Population.from_genomes(
+        connection_weight_random_add(synthetic_genome(size, rng), 20, -4, 4))
+    numpy_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    return lambda: population.random_add(20, -4, 4, numpy_rng).genomes()
+
+
+@benchmark("Population.best_20")
+def bench_population_best_20(size, rng):
+    population = Population.from_genomes(
+        connection_weight_random_add(synthetic_genome(size, rng), 400, -4, 4))
+    population.fitness[:] = np.random.default_rng(rng.randrange(2 ** 32)).uniform(0, 1, len(population))
+    return lambda: population.best(20)
+
+
+@benchmark("Genome.fromJSON")
+def bench_genome_from_json(size, rng):
+    genome_json = json.loads(json.dumps(synthetic_genome(size, rng),
+                                        default=lambda obj: obj.toJSON()))
+    return lambda: Genome.fromJSON(genome_json)
+
+
+def run_benchmark(name:str, size:GenomeSize, seed:int, rounds:int,
+                  min_time:float) -> BenchmarkResult:
+    rng = random.Random(seed)
+    random.seed(seed)
+    operation = BENCHMARKS[name](size, rng)
+
+    # Find an iteration count that runs for at least min_time
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        iterations *= 2
+
+    best = elapsed
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    operation()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return BenchmarkResult(name, iterations / best, peak_memory)
+
+
+def compare(results:List[BenchmarkResult], baseline:Dict[str, dict],
+            threshold:float) -> List[str]:
+    regressions = []
+    for result in results:
+        if result.name not in baseline:
+            continue
+
+        baseline_ops = baseline[result.name]["ops_per_sec"]
+        change = result.ops_per_sec / baseline_ops - 1
+        print(f"{result.name:36} {change * 100:+8.1f}%")
+
+        if change < -threshold:
+            regressions.append(result.name)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NEAT primitives")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS), default=[])
+    parser.add_argument("--inputs", type=int, default=16)
+    parser.add_argument("--outputs", type=int, default=3)
+    parser.add_argument("--hidden", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1,
+                        help="Minimum seconds per timing round")
+    parser.add_argument("--save-baseline", help="Write results as baseline json")
+    parser.add_argument("--compare", help="Baseline json to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed ops/sec slow down before failing, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    size = GenomeSize(args.inputs, args.outputs, args.hidden, args.connections)
+    names = args.only or list(BENCHMARKS)
+
+    print(f"{'benchmark':36} {'ops/sec':>14} {'peak memory':>14}")
+    results = []
+    for name in names:
+        result = run_benchmark(name, size, args.seed, args.rounds, args.min_time)
+        results.append(result)
+        print(f"{result.name:36} {result.ops_per_sec:14.1f} {result.peak_memory:14d}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "size": asdict(size),
+                "results": {result.name: asdict(result) for result in results},
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if baseline["size"] != asdict(size):
+            print("Warning: baseline was measured with a different genome size")
+
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.navigation_2d import Food, NavigationGame, RaycastMode, Wall
+from scripts.pygame_foundation import Math
+
+
+def random_rays(game:NavigationGame, count:int, rng:random.Random):
+    rays = []
+    for _ in range(count):
+        position = (rng.uniform(game.min_x, game.max_x), rng.uniform(game.min_y, game.max_y))
+        angle = rng.uniform(0, 2 * math.pi)
+        rays.append((position, (math.cos(angle), math.sin(angle))))
+    return rays
+
+
+def random_obstacles(game:NavigationGame, count:int, rng:random.Random):
+    for _ in range(count):
+        x = rng.uniform(game.min_x, game.max_x)
+        y = rng.uniform(game.min_y, game.max_y)
+        game.walls.append(Wall((x, y), (x + rng.uniform(1, 10), y + rng.uniform(1, 10))))
+
+        position = (rng.uniform(game.min_x, game.max_x), rng.uniform(game.min_y, game.max_y))
+        game.foods.append(Food(position, rng.uniform(1, 5)))
+
+
+def run_mode(game:NavigationGame, mode:RaycastMode, rays, rounds:int):
+    game.raycast_mode = mode
+
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hits = [game.raycast(position, direction) for position, direction in rays]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return len(rays) / best, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NavigationGame raycast modes")
+    parser.add_argument("--rays", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--walls", action="store_true",
+                        help="Add walls to the arena, it has none by default")
+    parser.add_argument("--obstacles", type=int, default=0,
+                        help="Add this many random walls and as many random foods")
+    parser.add_argument("--spatial-index", choices=["auto", "on", "off"], default="auto")
+    args = parser.parse_args()
+
+    spatial_index = {"auto": None, "on": True, "off": False}[args.spatial_index]
+    game = NavigationGame(False, spatial_index=spatial_index)
+    random_obstacles(game, args.obstacles, random.Random(args.seed + 1))
+    if args.walls:
+        game.walls.append(Wall((40, 60), (100, 90)))
+        game.walls.append(Wall((150, 120), (200, 180)))
+        game.walls.append(Wall((250, 20), (280, 100)))
+
+    rays = random_rays(game, args.rays, random.Random(args.seed))
+
+    stepped_speed, stepped_hits = run_mode(game, RaycastMode.Stepped, rays, args.rounds)
+    print(f"{'mode':12} {'rays/sec':>12} {'speed up':>9} {'same hit':>9} {'mean distance':>14}")
+
+    for mode in RaycastMode:
+        speed, hits = run_mode(game, mode, rays, args.rounds)
+
+        same = sum(hit[0] == stepped_hit[0] for hit, stepped_hit in zip(hits, stepped_hits))
+        if mode == RaycastMode.Quantized:
+            same = sum(hit == stepped_hit for hit, stepped_hit in zip(hits, stepped_hits))
+
+        distance = sum(Math.magnitude(position, hit[1])
+                       for (position, _), hit in zip(rays, hits)) / len(rays)
+
+        print(f"{mode.name:12} {speed:12.1f} {speed / stepped_speed:8.2f}x "
+              f"{same / len(rays) * 100:8.2f}% {distance:14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,48 @@
+import os
 import random
 import time
-import json
 import argparse
 from typing import List
 
 
 from scripts.NEAT import *
+from scripts.checkpoint import CheckpointWriter, read_checkpoint
+from scripts.population_manager import DefaultMaxPopulation, RetirePolicy
 from scripts.flappybird import FlappyBirdGame, GenomeBird, Bird
-from scripts.navigation_2d import GenomeCharacter, NavigationGame, Character
+from scripts.navigation_2d import GenomeCharacter, NavigationGame, Character, RaycastMode,\
+                                  ArenaLayout, FitnessAggregate, load_arena_layouts
+
+
+def add_population_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--max-population", type=int, default=DefaultMaxPopulation,
+                        help="Most individuals alive in one round, 0 for no cap")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="Estimated megabytes the population may use")
+    parser.add_argument("--retire-policy", choices=["worst", "oldest"], default="worst",
+                        help="Which carried over individuals go first over the limits")
+
+
+def parse_max_population(size):
+    if size <= 0:
+        return None
+    return size
+
+
+def parse_memory_budget(megabytes):
+    if megabytes is None:
+        return None
+    return int(megabytes * 1024 * 1024)
+
+
+def load_result_genomes(archive_path: str) -> List[Genome]:
+    """
+    Genomes of a result archive, or of the .json file older versions wrote
+    in its place
+    """
+    json_path = os.path.splitext(archive_path)[0] + ".json"
+    if not os.path.exists(archive_path) and os.path.exists(json_path):
+        return load_genome_file(json_path)
+    return load_genome_file(archive_path)
 
 
 class TerminalController:
@@ -18,12 +53,23 @@ class TerminalController:
         self.gaps = []
         self.run_pygame = False
         self.tick_limit = False
+        self.vectorized = False
+        self.seed = None
+        self.workers = 1
+        self.decision_interval = 1
+        self.fixed_course = False
+        self.checkpoint_path = None
+        self.checkpoint_interval = 10
+        self.profile_path = None
+        self.max_population = DefaultMaxPopulation
+        self.memory_budget = None
+        self.retire_policy = RetirePolicy.Worst
 
     def parse_enviroment_argument(self):
         parser = argparse.ArgumentParser()
 
         # Training engine configuration
-        parser.add_argument("mode", choices=["player", "empty", "last"])
+        parser.add_argument("mode", choices=["player", "empty", "last", "resume"])
         parser.add_argument("--demo", action="store_true",
                             help="Wether turn on pygame and tick limit",
                             default=False)
@@ -34,8 +80,31 @@ class TerminalController:
                             help="Gap between up and bottom grounds",
                             default=[])
         parser.add_argument("--gap-repeat", type=int, default=6)
+        parser.add_argument("--vectorized", action="store_true",
+                            help="Simulate birds as arrays when running without pygame",
+                            default=False)
+        parser.add_argument("--seed", type=int, default=None,
+                            help="Seed of the game random generator")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Processes evaluating the population, implies --vectorized")
+        parser.add_argument("--decision-interval", type=int, default=1,
+                            help="Query the networks every this many ticks")
+        parser.add_argument("--fixed-course", action="store_true",
+                            help="Play the same pipes every generation",
+                            default=False)
+        parser.add_argument("--checkpoint", default="checkpoint.npz",
+                            help="Training checkpoint written every few rounds and read by resume")
+        parser.add_argument("--checkpoint-interval", type=int, default=10,
+                            help="Rounds between checkpoints, 0 turns checkpoints off")
+        parser.add_argument("--profile", default=None,
+                            help="Write per generation phase timings as json lines, - for stderr")
+        add_population_arguments(parser)
 
         args = parser.parse_args()
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+        if args.decision_interval < 1:
+            parser.error("--decision-interval must be at least 1")
 
         self.mode = args.mode
         if args.mode == "player":
@@ -43,6 +112,19 @@ class TerminalController:
 
         self.run_pygame = args.demo
         self.tick_limit = args.demo
+        self.vectorized = args.vectorized and not args.demo
+        self.seed = args.seed
+        if not args.demo:
+            self.workers = args.workers
+        self.decision_interval = args.decision_interval
+        self.fixed_course = args.fixed_course
+        if args.mode != "player":
+            self.checkpoint_path = args.checkpoint
+        self.checkpoint_interval = args.checkpoint_interval
+        self.profile_path = args.profile
+        self.max_population = parse_max_population(args.max_population)
+        self.memory_budget = parse_memory_budget(args.memory_budget)
+        self.retire_policy = RetirePolicy[args.retire_policy.capitalize()]
 
         if args.gap == []:
             args.gap = [80, 70, 60, 55, 50]
@@ -58,6 +140,8 @@ class TerminalController:
             self.setup_player()
         elif self.mode == "empty":
             self.setup_empty_bird()
+        elif self.mode == "resume":
+            self.setup_from_checkpoint()
         else:
             self.setup_from_last_training()
 
@@ -65,18 +149,33 @@ class TerminalController:
         self.game = FlappyBirdGame(
             self.run_pygame,
             gaps=self.gaps,
-            tick_limit=self.tick_limit)
+            tick_limit=self.tick_limit,
+            vectorized=self.vectorized,
+            seed=self.seed,
+            workers=self.workers,
+            decision_interval=self.decision_interval,
+            fixed_course=self.fixed_course,
+            checkpoint_path=self.checkpoint_path,
+            checkpoint_interval=self.checkpoint_interval,
+            max_population=self.max_population,
+            memory_budget=self.memory_budget,
+            retire_policy=self.retire_policy)
+
+        if self.profile_path is not None:
+            self.game.enable_profiler(self.profile_path)
 
     def setup_player(self):
         bird = Bird(20, (40, 250))
-        self.game.birds.append(bird)
+        self.game.add_bird(bird)
 
     def setup_from_last_training(self):
-        with open("result.json") as f:
-            genome = Genome.fromJSON(json.load(f))
+        genome = load_result_genomes("result.npz")[0]
 
-            bird = GenomeBird(genome, 20, (40, 250))
-            self.game.birds.append(bird)
+        bird = GenomeBird(genome, 20, (40, 250))
+        self.game.add_bird(bird)
+
+    def setup_from_checkpoint(self):
+        self.game.restore_checkpoint(*read_checkpoint(self.checkpoint_path))
 
     def setup_empty_bird(self):
         base_genome = Genome(nodes=[
@@ -87,35 +186,114 @@ class TerminalController:
             NodeGene(NodeType.Output, OperatorType.Plus),
         ], connections=[])
 
-        mutations = connection_mutations(base_genome, 0, 0)
+        mutations = connection_mutations(base_genome, 0, 0, rng=self.game.random)
 
         for mutation in mutations:
-            variants = connection_weight_random_add(mutation, 20, -4, 4)
+            variants = connection_weight_random_add(mutation, 20, -4, 4, rng=self.game.random)
             for variant in variants:
                 bird = GenomeBird(variant, 20, (40, 250))
-                self.game.birds.append(bird)
+                self.game.add_bird(bird)
 
     def run(self):
         self.game.execute()
 
 
 class Navgation2DTerminalController:
-    def __init__(self):
-        self.game = NavigationGame(False, tick_limit=False)
+    def __init__(self, checkpoint_path="result/navigation-checkpoint.npz"):
+        self.checkpoint_path = checkpoint_path
+        self.game = NavigationGame(False, tick_limit=False,
+                                   checkpoint_path=checkpoint_path)
+
+        self.mode = "empty"
+
+    def parse_enviroment_argument(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument("mode", nargs="?", choices=["empty", "resume"], default="empty")
+        parser.add_argument("--checkpoint", default=self.checkpoint_path,
+                            help="Training checkpoint written every few rounds and read by resume")
+        parser.add_argument("--checkpoint-interval", type=int, default=10,
+                            help="Rounds between checkpoints, 0 turns checkpoints off")
+        parser.add_argument("--profile", default=None,
+                            help="Write per generation phase timings as json lines, - for stderr")
+        parser.add_argument("--raycast-mode", choices=["stepped", "quantized", "analytic"],
+                            default="quantized",
+                            help="Stepped marches the rays, quantized gives the same sensors faster, "
+                                 "analytic gives exact hit distances")
+        parser.add_argument("--decision-interval", type=int, default=1,
+                            help="Query the networks every this many ticks")
+        parser.add_argument("--batched-sensors", action="store_true", default=False,
+                            help="Cast the rays of every character at once with numpy")
+        parser.add_argument("--spatial-index", choices=["auto", "on", "off"], default="auto",
+                            help="Look walls and foods up in a grid, auto does once the arena is crowded")
+        parser.add_argument("--arena-file", default=None,
+                            help="Json list of arena layouts to score every genome on")
+        parser.add_argument("--arena-seed", action="append", type=int, default=[],
+                            help="Also score on an arena generated from this seed, can be repeated")
+        parser.add_argument("--default-arena", action="store_true", default=False,
+                            help="Also score on the default arena under the arena rules")
+        parser.add_argument("--arena-aggregate", choices=["mean", "min"], default="mean",
+                            help="How the arena scores of a genome make its fitness")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Processes playing the arena x shard jobs, needs arenas")
+        add_population_arguments(parser)
+        args = parser.parse_args()
+
+        self.mode = args.mode
+        self.checkpoint_path = args.checkpoint
+        self.game.checkpoint_writer = None
+        if args.checkpoint_interval > 0:
+            self.game.checkpoint_writer = CheckpointWriter(args.checkpoint, args.checkpoint_interval)
+
+        self.game.raycast_mode = RaycastMode[args.raycast_mode.capitalize()]
+        self.game.batched_sensors = args.batched_sensors
+        self.game.decision_interval = args.decision_interval
+        self.game.spatial_index = {"auto": None, "on": True, "off": False}[args.spatial_index]
+        self.game.invalidate_spatial_index()
+
+        if args.workers < 1:
+            parser.error("--workers must be at least 1")
+        if args.decision_interval < 1:
+            parser.error("--decision-interval must be at least 1")
+
+        # Arena rules differ from the single arena loop, finished characters
+        # wait for the time limit and everyone starts at the arena start, so
+        # they are only used when arenas are asked for
+        arenas = []
+        if args.default_arena:
+            arenas.append(ArenaLayout.default())
+        if args.arena_file is not None:
+            arenas += load_arena_layouts(args.arena_file)
+        arenas += [ArenaLayout.generate(seed) for seed in args.arena_seed]
+        if len(arenas) == 0 and args.workers > 1:
+            parser.error("--workers needs arenas, add --default-arena, --arena-file or --arena-seed")
+        self.game.arenas = arenas
+        self.game.workers = args.workers
+        self.game.arena_aggregate = FitnessAggregate[args.arena_aggregate.capitalize()]
+
+        if args.profile is not None:
+            self.game.enable_profiler(args.profile)
+
+        self.game.population_manager.max_size = parse_max_population(args.max_population)
+        self.game.population_manager.memory_budget = parse_memory_budget(args.memory_budget)
+        self.game.population_manager.policy = RetirePolicy[args.retire_policy.capitalize()]
 
     def setup(self):
-        self.setup_empty_genome()
+        if self.mode == "resume":
+            self.setup_from_checkpoint()
+        else:
+            self.setup_empty_genome()
+
+    def setup_from_checkpoint(self):
+        self.game.restore_checkpoint(*read_checkpoint(self.checkpoint_path))
 
     def setup_from_read(self):
-        with open("result/character-keyboard.json") as f:
-            genomes = json.load(f)
+        genomes = load_result_genomes("result/character-keyboard.npz")
 
-            # for genome_json in genomes:
-            genome_json = genomes[0]
-            genome = Genome.fromJSON(genome_json)
+        # for genome in genomes:
+        genome = genomes[0]
 
-            character = GenomeCharacter(genome, (50, 100), 10)
-            self.game.add_character(character=character)
+        character = GenomeCharacter(genome, self.game.start_position, 10)
+        self.game.add_character(character=character)
 
     def setup_empty_genome(self):
         nodes: List[NodeGene] = []
@@ -128,12 +306,12 @@ class Navgation2DTerminalController:
 
         base_genome = Genome(nodes=nodes, connections=[])
 
-        mutations = random.choices(connection_mutations(base_genome, 0, 0), k=20)
+        mutations = sample_mutations(base_genome, 20, 0, 0)
 
         for mutation in mutations:
             variants = connection_weight_random_add(mutation, 10, -4, 4)
             for variant in variants:
-                character = GenomeCharacter(variant, (50, 100), 10)
+                character = GenomeCharacter(variant, self.game.start_position, 10)
                 self.game.add_character(character=character)
 
     def run(self):
@@ -150,5 +328,6 @@ if __name__ == "__main__":
     # controller.run()
 
     controller = Navgation2DTerminalController()
+    controller.parse_enviroment_argument()
     controller.setup()
     controller.run()
@@ -1,4 +1,11 @@
 from .structure import NodeType, OperatorType, NodeGene, ConnectionGene,\
-                       Genome, ConnectionPair
+                       Genome, ConnectionPair, ConnectionIndex, MutationType,\
+                       MutationDescriptor
 from .functions import genome_feed_data, connection_mutations,\
-                       insert_node_mutations, connection_weight_random_add
+                       insert_node_mutations, connection_weight_random_add,\
+                       list_mutations, build_mutation, sample_mutations
+from .compiled import CompiledGenome
+from .batch import GenomeBatch
+from .population import Population
+from .innovation import InnovationRegistry, innovations
+from .archive import save_genomes, load_genomes, load_genome_file
@@ -0,0 +1,150 @@
+import json
+import sys
+import numpy as np
+
+from typing import List
+from .structure import Genome, NodeGene, ConnectionGene, NodeType, OperatorType
+from .innovation import innovations
+
+
+def pack_ids(prefix:str, ids:list) -> dict:
+    # Innovation numbers are stored as int64, results saved with uuid
+    # strings keep them as strings with a mask of the int ones
+    if all(isinstance(id_, int) for id_ in ids):
+        return {f"{prefix}_ids": np.asarray(ids, dtype=np.int64)}
+
+    return {
+        f"{prefix}_ids": np.asarray([str(id_) for id_ in ids], dtype=np.str_),
+        f"{prefix}_id_is_int": np.asarray([isinstance(id_, int) for id_ in ids], dtype=bool),
+    }
+
+
+def unpack_ids(prefix:str, archive) -> list:
+    ids = archive[f"{prefix}_ids"].tolist()
+
+    if f"{prefix}_id_is_int" in archive.files:
+        is_int = archive[f"{prefix}_id_is_int"].tolist()
+        ids = [int(id_) if id_is_int else id_ for id_, id_is_int in zip(ids, is_int)]
+
+    int_ids = [id_ for id_ in ids if isinstance(id_, int)]
+    if int_ids:
+        innovations.observe(max(int_ids))
+
+    return ids
+
+
+def pack_genomes(genomes:List[Genome]) -> dict:
+    """
+    Flatten genomes into the arrays stored in an archive
+    """
+    nodes = [node for genome in genomes for node in genome.nodes]
+    connections = [connection for genome in genomes for connection in genome.connections]
+
+    arrays = {
+        "node_counts": np.asarray([len(genome.nodes) for genome in genomes], dtype=np.int32),
+        "connection_counts": np.asarray([len(genome.connections) for genome in genomes], dtype=np.int32),
+
+        "node_types": np.asarray([node.type for node in nodes], dtype=np.int8),
+        "node_io_indexes": np.asarray([node.io_index for node in nodes], dtype=np.int32),
+        "node_operators": np.asarray([node.add_on_operator for node in nodes], dtype=np.int8),
+
+        "connection_inputs": np.asarray([connection.input_index for connection in connections], dtype=np.int32),
+        "connection_outputs": np.asarray([connection.output_index for connection in connections], dtype=np.int32),
+        "connection_weights": np.asarray([connection.weight for connection in connections], dtype=np.float64),
+        "connection_operators": np.asarray([connection.weight_operator for connection in connections], dtype=np.int8),
+        "connection_enabled": np.asarray([connection.enabled for connection in connections], dtype=bool),
+    }
+    arrays.update(pack_ids("node", [node.uuid for node in nodes]))
+    arrays.update(pack_ids("connection", [connection.uuid for connection in connections]))
+    return arrays
+
+
+def save_genomes(path:str, genomes:List[Genome], compressed:bool=False) -> None:
+    arrays = pack_genomes(genomes)
+
+    # Write through a file object so numpy doesn't append .npz to the path
+    with open(path, "wb") as f:
+        if compressed:
+            np.savez_compressed(f, **arrays)
+        else:
+            np.savez(f, **arrays)
+
+
+def unpack_genomes(archive) -> List[Genome]:
+    """
+    Rebuild genomes from the arrays of an opened archive
+    """
+    node_counts = archive["node_counts"].tolist()
+    connection_counts = archive["connection_counts"].tolist()
+
+    node_ids = unpack_ids("node", archive)
+    node_types = archive["node_types"].tolist()
+    node_io_indexes = archive["node_io_indexes"].tolist()
+    node_operators = archive["node_operators"].tolist()
+
+    connection_ids = unpack_ids("connection", archive)
+    connection_inputs = archive["connection_inputs"].tolist()
+    connection_outputs = archive["connection_outputs"].tolist()
+    connection_weights = archive["connection_weights"].tolist()
+    connection_operators = archive["connection_operators"].tolist()
+    connection_enabled = archive["connection_enabled"].tolist()
+
+    # Index the enum members directly, calling the enum classes is slow
+    node_type_members = list(NodeType)
+    operator_members = list(OperatorType)
+
+    nodes = [NodeGene(node_type_members[type_], operator_members[operator],
+                      uuid=id_, io_index=io_index)
+             for id_, type_, io_index, operator in zip(
+                 node_ids, node_types, node_io_indexes, node_operators)]
+    connections = [ConnectionGene(input_index, output_index, weight,
+                                  operator_members[operator], uuid=id_, enabled=enabled)
+                   for id_, input_index, output_index, weight, operator, enabled in zip(
+                       connection_ids, connection_inputs, connection_outputs,
+                       connection_weights, connection_operators, connection_enabled)]
+
+    genomes = []
+    node_start = 0
+    connection_start = 0
+    for node_count, connection_count in zip(node_counts, connection_counts):
+        genomes.append(Genome(
+            nodes=nodes[node_start:node_start + node_count],
+            connections=connections[connection_start:connection_start + connection_count]))
+
+        node_start += node_count
+        connection_start += connection_count
+
+    return genomes
+
+
+def load_genomes(path:str) -> List[Genome]:
+    with np.load(path) as archive:
+        return unpack_genomes(archive)
+
+
+def load_genome_file(path:str) -> List[Genome]:
+    """
+    Load genomes from an archive or from a JSON file holding one genome
+    or a list of genomes.
+    """
+    if not path.endswith(".json"):
+        return load_genomes(path)
+
+    with open(path) as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        return [Genome.fromJSON(data)]
+    return [Genome.fromJSON(genome_json) for genome_json in data]
+
+
+def convert_json(json_path:str, archive_path:str, compressed:bool=False) -> None:
+    save_genomes(archive_path, load_genome_file(json_path), compressed=compressed)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m scripts.NEAT.archive <input.json> <output.npz>")
+        sys.exit(1)
+
+    convert_json(sys.argv[1], sys.argv[2])
@@ -0,0 +1,137 @@
+import numpy as np
+
+from typing import List, Sequence, Union
+from .structure import Genome
+from .compiled import CompiledGenome, MULTIPLY_PLUS, PLUS_MULTIPLY,\
+                      MULTIPLY_MULTIPLY
+
+
+class GenomeBatch:
+    """
+    Feed a whole population of genomes in one vectorized pass.
+
+    Genomes with fewer nodes or connections are padded with a scratch node,
+    the padding connections only ever add zero into that scratch node.
+    """
+
+    def __init__(self, genomes:Sequence[Union[Genome, CompiledGenome]]) -> None:
+        compiled_genomes: List[CompiledGenome] = []
+        for genome in genomes:
+            if isinstance(genome, CompiledGenome):
+                compiled_genomes.append(genome)
+            else:
+                compiled_genomes.append(CompiledGenome(genome))
+
+        self.size = len(compiled_genomes)
+        if self.size == 0:
+            raise ValueError("GenomeBatch needs at least one genome")
+
+        self.output_count = len(compiled_genomes[0].output_slots)
+        for compiled in compiled_genomes:
+            if len(compiled.output_slots) != self.output_count:
+                raise ValueError("Genomes in a batch must have the same outputs count")
+
+        # The last column of the values matrix is the scratch node
+        self.node_count = max(compiled.node_count for compiled in compiled_genomes)
+        self.scratch_index = self.node_count
+
+        input_count = max(len(compiled.input_slots) for compiled in compiled_genomes)
+        connection_count = max(len(compiled.plan) for compiled in compiled_genomes)
+
+        self.input_nodes = np.full((self.size, input_count), self.scratch_index, dtype=np.intp)
+        self.input_io = np.zeros((self.size, input_count), dtype=np.intp)
+        self.output_nodes = np.zeros((self.size, self.output_count), dtype=np.intp)
+
+        self.sources = np.full((self.size, connection_count), self.scratch_index, dtype=np.intp)
+        self.destinations = np.full((self.size, connection_count), self.scratch_index, dtype=np.intp)
+        self.weights = np.zeros((self.size, connection_count), dtype=np.float64)
+        self.weight_multiply = np.zeros((self.size, connection_count), dtype=bool)
+        self.add_on_multiply = np.zeros((self.size, connection_count), dtype=bool)
+
+        for row, compiled in enumerate(compiled_genomes):
+            for column, (node_index, io_index) in enumerate(compiled.input_slots):
+                self.input_nodes[row, column] = node_index
+                self.input_io[row, column] = io_index
+
+            self.output_nodes[row] = compiled.output_slots
+
+            length = len(compiled.plan)
+            self.sources[row, :length] = compiled.input_indexes
+            self.destinations[row, :length] = compiled.output_indexes
+            self.weights[row, :length] = compiled.weights
+
+            opcodes = np.asarray(compiled.opcodes, dtype=np.int8)
+            self.weight_multiply[row, :length] = opcodes >= MULTIPLY_PLUS
+            self.add_on_multiply[row, :length] = (opcodes == PLUS_MULTIPLY) | (opcodes == MULTIPLY_MULTIPLY)
+
+    @staticmethod
+    def from_weights(genome:Genome, weights:np.ndarray) -> "GenomeBatch":
+        """
+        Batch of genomes sharing the topology of genome, weights holds one
+        row of connection weights (disabled ones included) per genome.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        batch = GenomeBatch([genome])
+
+        size = weights.shape[0]
+        for name in ("input_nodes", "input_io", "output_nodes", "sources",
+                     "destinations", "weight_multiply", "add_on_multiply"):
+            setattr(batch, name, np.repeat(getattr(batch, name), size, axis=0))
+
+        enabled = [i for i, connection in enumerate(genome.connections) if connection.enabled]
+        batch.weights = weights[:, enabled]
+        batch.size = size
+        return batch
+
+    def feed(self, inputs:np.ndarray, rows:np.ndarray=None) -> np.ndarray:
+        """
+        Feed an (n, inputs count) matrix, returns (n, outputs count).
+        If rows is given, inputs[i] is fed to the genome at rows[i].
+        """
+        inputs = np.asarray(inputs, dtype=np.float64)
+
+        if rows is None:
+            input_nodes = self.input_nodes
+            input_io = self.input_io
+            output_nodes = self.output_nodes
+            sources = self.sources
+            destinations = self.destinations
+            weights = self.weights
+            weight_multiply = self.weight_multiply
+            add_on_multiply = self.add_on_multiply
+        else:
+            rows = np.asarray(rows, dtype=np.intp)
+            input_nodes = self.input_nodes[rows]
+            input_io = self.input_io[rows]
+            output_nodes = self.output_nodes[rows]
+            sources = self.sources[rows]
+            destinations = self.destinations[rows]
+            weights = self.weights[rows]
+            weight_multiply = self.weight_multiply[rows]
+            add_on_multiply = self.add_on_multiply[rows]
+
+        count = inputs.shape[0]
+        index = np.arange(count)[:, None]
+
+        values = np.zeros((count, self.node_count + 1), dtype=np.float64)
+        if input_nodes.shape[1] > 0:
+            values[index, input_nodes] = inputs[index, input_io]
+            values[:, self.scratch_index] = 0
+
+        index = index[:, 0]
+        with np.errstate(over="ignore", invalid="ignore"):
+            for column in range(sources.shape[1]):
+                source_values = values[index, sources[:, column]]
+                weight = weights[:, column]
+                value = np.where(weight_multiply[:, column],
+                                 source_values * weight,
+                                 source_values + weight)
+
+                destination = destinations[:, column]
+                current = values[index, destination]
+                multiplied = np.where(current == 0, value, current * value)
+                values[index, destination] = np.where(add_on_multiply[:, column],
+                                                      multiplied,
+                                                      current + value)
+
+        return values[index[:, None], output_nodes]
@@ -0,0 +1,74 @@
+from typing import List
+from .structure import Genome, NodeType, OperatorType
+
+
+# Connection opcodes, combining the connection weight operator with the
+# add on operator of its output node
+PLUS_PLUS = 0
+PLUS_MULTIPLY = 1
+MULTIPLY_PLUS = 2
+MULTIPLY_MULTIPLY = 3
+
+
+class CompiledGenome:
+    """
+    Flat execution plan of a genome, built once and fed many times.
+    Gives the same results as genome_feed_data.
+    """
+
+    def __init__(self, genome:Genome) -> None:
+        self.node_count = len(genome.nodes)
+
+        # (node index, input index) of every input node
+        self.input_slots = []
+        self.output_slots = []
+
+        for i, node in enumerate(genome.nodes):
+            if node.type == NodeType.Input:
+                self.input_slots.append((i, node.io_index))
+            elif node.type == NodeType.Output:
+                self.output_slots.append(i)
+
+        self.input_indexes: List[int] = []
+        self.output_indexes: List[int] = []
+        self.weights: List[float] = []
+        self.opcodes: List[int] = []
+
+        for connection in genome.connections:
+            if not connection.enabled:
+                continue
+
+            opcode = 0
+            if connection.weight_operator == OperatorType.Multiply:
+                opcode += 2
+            output_node = genome.nodes[connection.output_index]
+            if output_node.add_on_operator == OperatorType.Multiply:
+                opcode += 1
+
+            self.input_indexes.append(connection.input_index)
+            self.output_indexes.append(connection.output_index)
+            self.weights.append(connection.weight)
+            self.opcodes.append(opcode)
+
+        self.plan = list(zip(self.input_indexes, self.output_indexes,
+                             self.weights, self.opcodes))
+
+    def feed(self, inputs:List[float]) -> List[float]:
+        values = [0] * self.node_count
+        for node_index, io_index in self.input_slots:
+            values[node_index] = inputs[io_index]
+
+        for input_index, output_index, weight, opcode in self.plan:
+            if opcode < MULTIPLY_PLUS:
+                value = values[input_index] + weight
+            else:
+                value = values[input_index] * weight
+
+            if opcode == PLUS_PLUS or opcode == MULTIPLY_PLUS:
+                values[output_index] += value
+            elif values[output_index] == 0:
+                values[output_index] = value
+            else:
+                values[output_index] *= value
+
+        return [values[i] for i in self.output_slots]
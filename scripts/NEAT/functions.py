@@ -1,35 +1,51 @@
 import random
-import copy
 
 from scripts import NEAT
 from typing import List
-from .structure import ConnectionGene, Genome, NodeGene, NodeType, OperatorType, ConnectionPair
+from .structure import ConnectionGene, Genome, NodeGene, NodeType, OperatorType, ConnectionPair,\
+                       MutationType, MutationDescriptor
+from .innovation import innovations
 
 
-def random_float(min_:float, max_:float) -> float:
-    return random.random() * (max_ - min_) + min_
+# Functions drawing random numbers take an rng, a random.Random or the
+# random module itself, so a game can run from its own seeded generator
+def random_float(min_:float, max_:float, rng:random.Random=random) -> float:
+    return rng.random() * (max_ - min_) + min_
+
+
+def connection_innovation(genome:Genome, input_index:int, output_index:int) -> int:
+    return innovations.connection_id(genome.nodes[input_index].uuid,
+                                     genome.nodes[output_index].uuid)
 
 
 def genome_feed_data(genome:Genome, inputs:List[float]) -> List[float]:
+    # Operators and node types are int opcodes, compare with plain ints
+    # instead of resolving the enum members on every connection
+    input_type = int(NodeType.Input)
+    output_type = int(NodeType.Output)
+    plus = int(OperatorType.Plus)
+    multiply = int(OperatorType.Multiply)
+
+    nodes = genome.nodes
     values = []
 
-    for node in genome.nodes:
-        if node.type == NodeType.Input:
+    for node in nodes:
+        if node.type == input_type:
             values.append(inputs[node.io_index])
         else:
             values.append(0)
 
     for connection in genome.connections:
         if connection.enabled:
-            if connection.weight_operator == OperatorType.Plus:
+            if connection.weight_operator == plus:
                 value = values[connection.input_index] + connection.weight
-            elif connection.weight_operator == OperatorType.Multiply:
+            elif connection.weight_operator == multiply:
                 value = values[connection.input_index] * connection.weight
             
-            output_node_operator = genome.nodes[connection.output_index].add_on_operator
-            if output_node_operator == OperatorType.Plus:
+            output_node_operator = nodes[connection.output_index].add_on_operator
+            if output_node_operator == plus:
                 values[connection.output_index] += value
-            elif output_node_operator == OperatorType.Multiply:
+            elif output_node_operator == multiply:
                 if (values[connection.output_index] == 0):
                     values[connection.output_index] = value
                 else:
@@ -37,8 +53,8 @@ def genome_feed_data(genome:Genome, inputs:List[float]) -> List[float]:
 
     output_values = []
 
-    for i, node in enumerate(genome.nodes):
-        if node.type == NodeType.Output:
+    for i, node in enumerate(nodes):
+        if node.type == output_type:
             output_values.append(values[i])
     
     return output_values
@@ -54,60 +70,51 @@ def get_exist_pair_in_genome(genome:Genome) -> List[ConnectionPair]:
 
 
 def analyze_potential_new_connections(genome:Genome) -> List[ConnectionPair]:
-    input_node_index = []
-    output_node_index = []
-
-    # Analyze genome potential connection
-    for i, node in enumerate(genome.nodes):
-        if node.type == NodeType.Input:
-            input_node_index.append(i)
-        elif node.type == NodeType.Hidden:
-            input_node_index.append(i)
-            output_node_index.append(i)
-        elif node.type == NodeType.Output:
-            output_node_index.append(i)
-
+    index = genome.connection_index
     pairs = []
-    existed_pairs = get_exist_pair_in_genome(genome=genome)
 
-    for input_index in input_node_index:
-        for output_index in output_node_index:
-            if input_index != output_index:
-                new_pair = ConnectionPair(input_node_index=input_index,
-                                          output_nodex_index=output_index)
-                
-                if new_pair not in existed_pairs and new_pair not in pairs:
-                    pairs.append(new_pair)
+    for input_index in index.input_nodes:
+        for output_index in index.output_nodes:
+            if input_index != output_index and\
+               (input_index, output_index) not in index.pairs:
+                pairs.append(ConnectionPair(input_node_index=input_index,
+                                            output_nodex_index=output_index))
 
     return pairs
 
 
 def mutate_genome_by_add_new_connection(genome:Genome,
                                         connection:ConnectionGene) -> Genome:
-    genome_copy = copy.deepcopy(genome)
-    genome_copy.connections.append(connection)
+    # Share the node genes and the existing connection genes with the parent
+    mutation = Genome(nodes=genome.nodes,
+                      connections=genome.connections + [connection])
+    mutation.inherit_connection_index(genome, new_connections=[connection])
 
-    return genome_copy
+    return mutation
 
 
 def connection_mutations(genome:Genome, weight_min:float,
-                         weight_max:float) -> List[Genome]:
+                         weight_max:float, rng:random.Random=random) -> List[Genome]:
     new_connection_pairs = analyze_potential_new_connections(genome=genome)
     mutations = []
 
     for pair in new_connection_pairs:
-        weight = random_float(weight_min, weight_max)
+        weight = random_float(weight_min, weight_max, rng)
+        innovation = connection_innovation(genome, pair.input_node_index,
+                                           pair.output_nodex_index)
         # pair.input_node_index
         connection = ConnectionGene(pair.input_node_index,
                                     pair.output_nodex_index,
-                                    weight, OperatorType.Plus)
+                                    weight, OperatorType.Plus,
+                                    uuid=innovation)
 
         mutations.append(mutate_genome_by_add_new_connection(
             genome=genome, connection=connection))
 
         connection = ConnectionGene(pair.input_node_index,
                                     pair.output_nodex_index,
-                                    weight, OperatorType.Multiply)
+                                    weight, OperatorType.Multiply,
+                                    uuid=innovation)
 
         mutations.append(mutate_genome_by_add_new_connection(
             genome=genome, connection=connection))
@@ -118,14 +125,33 @@ def connection_mutations(genome:Genome, weight_min:float,
 def mutate_genome_by_insert_connection(
         genome:Genome, connection_index:int, new_node:NodeGene,
         connection_1:ConnectionGene, connection_2:ConnectionGene) -> Genome:
-    genome_copy = copy.deepcopy(genome)
-    genome_copy.connections[connection_index].enabled = False
+    # Only the disabled connection gets copied, other genes are shared
+    connections = list(genome.connections)
+    connections[connection_index] = connections[connection_index].copy(enabled=False)
+    connections.append(connection_1)
+    connections.append(connection_2)
+
+    mutation = Genome(nodes=genome.nodes + [new_node], connections=connections)
+    mutation.inherit_connection_index(genome, new_nodes=[new_node],
+                                      new_connections=[connection_1, connection_2])
 
-    genome_copy.nodes.append(new_node)
-    genome_copy.connections.append(connection_1)
-    genome_copy.connections.append(connection_2)
+    return mutation
 
-    return genome_copy
+
+def split_connection_innovations(genome:Genome, connection:ConnectionGene):
+    """
+    New hidden node and the innovations of the two halves when inserting
+    it into connection.
+    """
+    new_node = NodeGene(NodeType.Hidden, OperatorType.Plus,
+                        uuid=innovations.node_id(connection.uuid))
+
+    input_node_id = genome.nodes[connection.input_index].uuid
+    output_node_id = genome.nodes[connection.output_index].uuid
+
+    return (new_node,
+            innovations.connection_id(input_node_id, new_node.uuid),
+            innovations.connection_id(new_node.uuid, output_node_id))
 
 
 def insert_node_mutations(genome:Genome) -> List[Genome]:
@@ -133,32 +159,135 @@ def insert_node_mutations(genome:Genome) -> List[Genome]:
     for i, connection in enumerate(genome.connections):
         middle_index = len(genome.nodes)
 
-        new_node = NodeGene(NodeType.Hidden, OperatorType.Plus)
+        new_node, first_half_innovation, second_half_innovation =\
+            split_connection_innovations(genome, connection)
         first_half = ConnectionGene(
             connection.input_index, middle_index, 1,
-            OperatorType.Multiply)
+            OperatorType.Multiply, uuid=first_half_innovation)
         second_half = ConnectionGene(
             middle_index, connection.output_index,
-            connection.weight, connection.weight_operator)
+            connection.weight, connection.weight_operator,
+            uuid=second_half_innovation)
 
         mutations.append(mutate_genome_by_insert_connection(genome, i, new_node, first_half, second_half))
 
         first_half = ConnectionGene(
             connection.input_index, middle_index, 0,
-            OperatorType.Plus)
+            OperatorType.Plus, uuid=first_half_innovation)
 
         mutations.append(mutate_genome_by_insert_connection(genome, i, new_node, first_half, second_half))
 
     return mutations
 
 
-def connection_weight_random_add(genome:Genome, count:int, range_min:float, range_max:float) -> List[Genome]:
+def connection_weight_random_add(genome:Genome, count:int, range_min:float, range_max:float,
+                                 rng:random.Random=random) -> List[Genome]:
     variants = []
 
     for i in range(count):
-        variant:Genome = copy.deepcopy(genome)
-        for connection in variant.connections:
-            connection.weight += random_float(range_min, range_max)
+        connections = []
+        for connection in genome.connections:
+            connections.append(connection.copy(
+                weight=connection.weight + random_float(range_min, range_max, rng)))
+
+        # Weight variants share the node genes with their parent
+        variant = Genome(nodes=genome.nodes, connections=connections)
+        variant.inherit_connection_index(genome)
         variants.append(variant)
     
     return variants
+
+
+def list_mutations(genome:Genome) -> List[MutationDescriptor]:
+    """
+    Describe every mutation connection_mutations + insert_node_mutations
+    would create, in the same order, without building any genome.
+    """
+    descriptors = []
+
+    for pair in analyze_potential_new_connections(genome=genome):
+        for operator in (OperatorType.Plus, OperatorType.Multiply):
+            descriptors.append(MutationDescriptor(
+                MutationType.NewConnection, operator, pair=pair))
+
+    for i in range(len(genome.connections)):
+        for operator in (OperatorType.Multiply, OperatorType.Plus):
+            descriptors.append(MutationDescriptor(
+                MutationType.InsertNode, operator, connection_index=i))
+
+    return descriptors
+
+
+def build_mutation(genome:Genome, descriptor:MutationDescriptor,
+                   weight_min:float, weight_max:float,
+                   rng:random.Random=random, weight:float=None) -> Genome:
+    """
+    weight is the new connection weight, drawn from the range when None
+    """
+    if descriptor.type == MutationType.NewConnection:
+        if weight is None:
+            weight = random_float(weight_min, weight_max, rng)
+        connection = ConnectionGene(descriptor.pair.input_node_index,
+                                    descriptor.pair.output_nodex_index,
+                                    weight,
+                                    descriptor.operator,
+                                    uuid=connection_innovation(
+                                        genome,
+                                        descriptor.pair.input_node_index,
+                                        descriptor.pair.output_nodex_index))
+
+        return mutate_genome_by_add_new_connection(
+            genome=genome, connection=connection)
+
+    connection = genome.connections[descriptor.connection_index]
+    middle_index = len(genome.nodes)
+
+    new_node, first_half_innovation, second_half_innovation =\
+        split_connection_innovations(genome, connection)
+    if descriptor.operator == OperatorType.Multiply:
+        first_half = ConnectionGene(
+            connection.input_index, middle_index, 1,
+            OperatorType.Multiply, uuid=first_half_innovation)
+    else:
+        first_half = ConnectionGene(
+            connection.input_index, middle_index, 0,
+            OperatorType.Plus, uuid=first_half_innovation)
+    second_half = ConnectionGene(
+        middle_index, connection.output_index,
+        connection.weight, connection.weight_operator,
+        uuid=second_half_innovation)
+
+    return mutate_genome_by_insert_connection(
+        genome, descriptor.connection_index, new_node, first_half, second_half)
+
+
+def sample_mutations(genome:Genome, count:int, weight_min:float,
+                     weight_max:float, replace:bool=False,
+                     rng:random.Random=random) -> List[Genome]:
+    """
+    Pick count mutations and only build the picked ones, without
+    replacement unless replace is set.
+    """
+    descriptors = list_mutations(genome)
+    if len(descriptors) == 0:
+        return []
+
+    if replace:
+        descriptors = rng.choices(descriptors, k=count)
+    else:
+        descriptors = rng.sample(descriptors, min(count, len(descriptors)))
+
+    # The Plus and Multiply connections of a pair get the same weight, like
+    # connection_mutations gives them
+    pair_weights = {}
+    mutations = []
+    for descriptor in descriptors:
+        weight = None
+        if descriptor.type == MutationType.NewConnection:
+            key = (descriptor.pair.input_node_index, descriptor.pair.output_nodex_index)
+            if key not in pair_weights:
+                pair_weights[key] = random_float(weight_min, weight_max, rng)
+            weight = pair_weights[key]
+
+        mutations.append(build_mutation(genome, descriptor, weight_min, weight_max, rng, weight))
+    return mutations
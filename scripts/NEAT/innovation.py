@@ -0,0 +1,66 @@
+from typing import Dict, Hashable, Tuple
+
+
+class InnovationRegistry:
+    """
+    Hand out compact integer gene ids. Within a generation, the same new
+    connection (same input and output node) or the same node inserted into
+    the same connection gets the same id in every genome.
+    """
+
+    def __init__(self, start:int=0) -> None:
+        self.next_innovation = start
+        self.connection_innovations: Dict[Tuple[Hashable, Hashable], int] = {}
+        self.node_innovations: Dict[Hashable, int] = {}
+
+    def next_id(self) -> int:
+        innovation = self.next_innovation
+        self.next_innovation += 1
+        return innovation
+
+    def connection_id(self, input_node_id:Hashable, output_node_id:Hashable) -> int:
+        key = (input_node_id, output_node_id)
+        if key not in self.connection_innovations:
+            self.connection_innovations[key] = self.next_id()
+        return self.connection_innovations[key]
+
+    def node_id(self, split_connection_id:Hashable) -> int:
+        if split_connection_id not in self.node_innovations:
+            self.node_innovations[split_connection_id] = self.next_id()
+        return self.node_innovations[split_connection_id]
+
+    def observe(self, innovation:Hashable) -> None:
+        # Keep ids loaded from files from being handed out again,
+        # older files use uuid strings which never collide
+        if isinstance(innovation, int) and innovation >= self.next_innovation:
+            self.next_innovation = innovation + 1
+
+    def new_generation(self) -> None:
+        self.connection_innovations.clear()
+        self.node_innovations.clear()
+
+    def getstate(self) -> dict:
+        """
+        JSON serializable state, restored with setstate
+        """
+        return {
+            "next_innovation": self.next_innovation,
+            "connection_innovations": [[input_node_id, output_node_id, innovation]
+                                       for (input_node_id, output_node_id), innovation
+                                       in self.connection_innovations.items()],
+            "node_innovations": [[split_connection_id, innovation]
+                                 for split_connection_id, innovation
+                                 in self.node_innovations.items()],
+        }
+
+    def setstate(self, state:dict) -> None:
+        self.next_innovation = state["next_innovation"]
+        self.connection_innovations = {
+            (input_node_id, output_node_id): innovation
+            for input_node_id, output_node_id, innovation in state["connection_innovations"]}
+        self.node_innovations = {
+            split_connection_id: innovation
+            for split_connection_id, innovation in state["node_innovations"]}
+
+
+innovations = InnovationRegistry()
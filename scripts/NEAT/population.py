@@ -0,0 +1,115 @@
+import numpy as np
+
+from typing import Dict, List, Sequence
+from .structure import Genome
+from .batch import GenomeBatch
+
+
+def topology_key(genome:Genome) -> tuple:
+    nodes = tuple((node.uuid, node.type, node.io_index, node.add_on_operator)
+                  for node in genome.nodes)
+    connections = tuple((connection.uuid, connection.input_index,
+                         connection.output_index, connection.weight_operator,
+                         connection.enabled)
+                        for connection in genome.connections)
+    return nodes, connections
+
+
+class Population:
+    """
+    Genomes sharing one topology, stored as struct of arrays.
+
+    Row i of weights holds the connection weights of genome i, fitness,
+    alive and parent_ids are parallel per genome arrays.
+    """
+
+    def __init__(self, topology:Genome, weights:np.ndarray,
+                 parent_ids:np.ndarray=None) -> None:
+        self.topology = topology
+        weights = np.asarray(weights, dtype=np.float64)
+        # Without connections every row is empty, so the size can't be
+        # inferred from the data
+        self.weights = weights.reshape(len(weights), len(topology.connections))
+
+        size = self.weights.shape[0]
+        self.fitness = np.zeros(size, dtype=np.float64)
+        self.alive = np.ones(size, dtype=bool)
+
+        if parent_ids is None:
+            self.parent_ids = np.full(size, -1, dtype=np.int64)
+        else:
+            self.parent_ids = np.asarray(parent_ids, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.weights.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return (self.weights.nbytes + self.fitness.nbytes +
+                self.alive.nbytes + self.parent_ids.nbytes)
+
+    @staticmethod
+    def from_genomes(genomes:Sequence[Genome]) -> "Population":
+        if len(genomes) == 0:
+            raise ValueError("Population needs at least one genome")
+
+        key = topology_key(genomes[0])
+        for genome in genomes[1:]:
+            if topology_key(genome) != key:
+                raise ValueError("Genomes of a population must share the same topology")
+
+        weights = [[connection.weight for connection in genome.connections]
+                   for genome in genomes]
+        return Population(genomes[0], weights)
+
+    @staticmethod
+    def group(genomes:Sequence[Genome]) -> List["Population"]:
+        groups: Dict[tuple, List[Genome]] = {}
+        for genome in genomes:
+            groups.setdefault(topology_key(genome), []).append(genome)
+
+        return [Population.from_genomes(group) for group in groups.values()]
+
+    def genome(self, index:int) -> Genome:
+        connections = []
+        for connection, weight in zip(self.topology.connections, self.weights[index].tolist()):
+            connections.append(connection.copy(weight=weight))
+
+        genome = Genome(nodes=self.topology.nodes, connections=connections)
+        genome.inherit_connection_index(self.topology)
+        return genome
+
+    def genomes(self) -> List[Genome]:
+        return [self.genome(i) for i in range(len(self))]
+
+    def select(self, indexes:np.ndarray) -> "Population":
+        indexes = np.asarray(indexes, dtype=np.intp)
+
+        population = Population(self.topology, self.weights[indexes],
+                                self.parent_ids[indexes])
+        population.fitness = self.fitness[indexes]
+        population.alive = self.alive[indexes]
+        return population
+
+    def best(self, count:int) -> "Population":
+        # Stable sort keeps the original order between equal fitness
+        order = np.argsort(-self.fitness, kind="stable")
+        return self.select(order[:count])
+
+    def random_add(self, count:int, range_min:float, range_max:float,
+                   rng:np.random.Generator=None) -> "Population":
+        """
+        Same as connection_weight_random_add for every genome, count
+        variants per genome made with one random matrix add.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        weights = np.repeat(self.weights, count, axis=0)
+        weights += rng.uniform(range_min, range_max, size=weights.shape)
+
+        parent_ids = np.repeat(np.arange(len(self)), count)
+        return Population(self.topology, weights, parent_ids)
+
+    def batch(self) -> GenomeBatch:
+        return GenomeBatch.from_weights(self.topology, self.weights)
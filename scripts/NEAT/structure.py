@@ -1,34 +1,36 @@
 import json
 
-from dataclasses import dataclass
-from enum import Enum
+from dataclasses import dataclass, field
+from enum import Enum, IntEnum
 from os import stat
-from typing import List
-from uuid import uuid1
+from typing import List, Set, Tuple
+from .innovation import innovations
 
 
-class NodeType(Enum):
+# Small int opcodes, compared as plain ints
+class NodeType(IntEnum):
     Input = 0
     Output = 1
     Hidden = 2
 
 
-class OperatorType(Enum):
+class OperatorType(IntEnum):
     Plus = 0
     Multiply = 1
 
 
-@dataclass(init=False)
+@dataclass(init=False, slots=True)
 class NodeGene:
-    uuid: str
+    # Innovation number, results saved before it are uuid strings
+    uuid: int
     type: NodeType
     io_index: int
     add_on_operator: OperatorType
 
     def __init__(self, type:NodeType, add_on_operator:OperatorType,
-                 uuid:str=None, io_index:int=0) -> None:
+                 uuid:int=None, io_index:int=0) -> None:
         if uuid is None:
-            self.uuid = str(uuid1())
+            self.uuid = innovations.next_id()
         else:
             self.uuid = uuid
 
@@ -46,6 +48,7 @@ class NodeGene:
 
     @staticmethod
     def fromJSON(json):
+        innovations.observe(json["uuid"])
         return NodeGene(
             type=NodeType(json["type"]),
             uuid=json["uuid"],
@@ -53,9 +56,9 @@ class NodeGene:
             add_on_operator=OperatorType(json["add_on_operator"]))
 
 
-@dataclass(init=False)
+@dataclass(init=False, slots=True)
 class ConnectionGene:
-    uuid: str
+    uuid: int
     input_index: int
     output_index: int
     weight: float
@@ -63,10 +66,10 @@ class ConnectionGene:
     enabled: bool
 
     def __init__(self, input_index:int, output_index:int, weight:float,
-                 weight_operator:OperatorType, uuid:str=None,
+                 weight_operator:OperatorType, uuid:int=None,
                  enabled:bool=True) -> None:
         if uuid is None:
-            self.uuid = str(uuid1())
+            self.uuid = innovations.next_id()
         else:
             self.uuid = uuid
 
@@ -76,6 +79,15 @@ class ConnectionGene:
         self.weight_operator = weight_operator
         self.enabled = enabled
 
+    def copy(self, weight:float=None, enabled:bool=None) -> "ConnectionGene":
+        return ConnectionGene(
+            input_index=self.input_index,
+            output_index=self.output_index,
+            weight=self.weight if weight is None else weight,
+            weight_operator=self.weight_operator,
+            uuid=self.uuid,
+            enabled=self.enabled if enabled is None else enabled)
+
     def toJSON(self):
         return {
             "uuid": self.uuid,
@@ -88,6 +100,7 @@ class ConnectionGene:
 
     @staticmethod
     def fromJSON(json):
+        innovations.observe(json["uuid"])
         return ConnectionGene(
             uuid=json["uuid"],
             input_index=json["input_index"],
@@ -97,11 +110,88 @@ class ConnectionGene:
             enabled=json["enabled"])
 
 
+class ConnectionIndex:
+    """
+    Hashed index of the connected (input, output) node pairs of a genome and
+    of the nodes that can be the input or output of a new connection.
+    """
+
+    def __init__(self) -> None:
+        self.pairs: Set[Tuple[int, int]] = set()
+        self.input_nodes: List[int] = []
+        self.output_nodes: List[int] = []
+        self.node_count = 0
+
+    @staticmethod
+    def build(genome:"Genome") -> "ConnectionIndex":
+        index = ConnectionIndex()
+        for node in genome.nodes:
+            index.add_node(node)
+        for connection in genome.connections:
+            index.add_connection(connection)
+        return index
+
+    def add_node(self, node:NodeGene) -> None:
+        if node.type == NodeType.Input:
+            self.input_nodes.append(self.node_count)
+        elif node.type == NodeType.Hidden:
+            self.input_nodes.append(self.node_count)
+            self.output_nodes.append(self.node_count)
+        elif node.type == NodeType.Output:
+            self.output_nodes.append(self.node_count)
+
+        self.node_count += 1
+
+    def add_connection(self, connection:"ConnectionGene") -> None:
+        self.pairs.add((connection.input_index, connection.output_index))
+
+    def copy(self) -> "ConnectionIndex":
+        index = ConnectionIndex()
+        index.pairs = set(self.pairs)
+        index.input_nodes = list(self.input_nodes)
+        index.output_nodes = list(self.output_nodes)
+        index.node_count = self.node_count
+        return index
+
+
 @dataclass
 class Genome:
+    # Genes and gene lists are shared between a genome and its mutations,
+    # never modify them in place, build a new genome instead
     nodes: List[NodeGene]
     connections: List[ConnectionGene]
 
+    _connection_index: ConnectionIndex = field(
+        default=None, init=False, repr=False, compare=False)
+
+    @property
+    def connection_index(self) -> ConnectionIndex:
+        if self._connection_index is None:
+            self._connection_index = ConnectionIndex.build(self)
+        return self._connection_index
+
+    def inherit_connection_index(self, parent:"Genome",
+                                 new_nodes:List[NodeGene]=(),
+                                 new_connections:List[ConnectionGene]=()) -> None:
+        """
+        Derive the connection index from the parent's, this genome must be
+        the parent plus new_nodes and new_connections appended.
+        """
+        if parent._connection_index is None:
+            return
+
+        if len(new_nodes) == 0 and len(new_connections) == 0:
+            # Same structure, the index can be shared
+            self._connection_index = parent._connection_index
+            return
+
+        index = parent._connection_index.copy()
+        for node in new_nodes:
+            index.add_node(node)
+        for connection in new_connections:
+            index.add_connection(connection)
+        self._connection_index = index
+
     def toJSON(self):
         return {
             "nodes": self.nodes,# json.dumps(self.nodes, default=lambda obj: obj.toJSON()),
@@ -149,6 +239,21 @@ class ConnectionPair:
     output_nodex_index: int
 
 
+class MutationType(Enum):
+    NewConnection = 0
+    InsertNode = 1
+
+
+@dataclass
+class MutationDescriptor:
+    type: MutationType
+    # Weight operator of the new connection, or of the first half of the
+    # split connection when inserting a node
+    operator: OperatorType
+    pair: ConnectionPair = None
+    connection_index: int = None
+
+
 @dataclass
 class Range:
     min_:float
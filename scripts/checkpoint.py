@@ -0,0 +1,89 @@
+import os
+import json
+import random
+import threading
+import numpy as np
+
+from typing import List, Tuple
+from .NEAT import Genome
+from .NEAT.archive import pack_genomes, unpack_genomes
+
+
+def dump_random_state(rng:random.Random=random) -> list:
+    version, internal_state, gauss_next = rng.getstate()
+    return [version, list(internal_state), gauss_next]
+
+
+def load_random_state(state:list, rng:random.Random=random) -> None:
+    version, internal_state, gauss_next = state
+    rng.setstate((version, tuple(internal_state), gauss_next))
+
+
+def write_checkpoint(path:str, genomes:List[Genome], state:dict) -> None:
+    """
+    Write the genomes and the json state into one archive. The archive is
+    written next to path and then renamed over it, so a crash mid write
+    leaves the previous checkpoint intact.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    arrays = pack_genomes(genomes)
+    arrays["state"] = np.asarray(json.dumps(state))
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def read_checkpoint(path:str) -> Tuple[List[Genome], dict]:
+    with np.load(path) as archive:
+        genomes = unpack_genomes(archive)
+        state = json.loads(archive["state"].item())
+    return genomes, state
+
+
+class CheckpointWriter:
+    """
+    Write checkpoints on a background thread so the training loop doesn't
+    wait for the disk. Genes are never modified in place, so the genomes
+    can be packed while the game keeps mutating new ones. A failed write
+    is raised by the next save or wait.
+    """
+
+    def __init__(self, path:str, interval:int=10) -> None:
+        self.path = path
+        # Rounds between checkpoints
+        self.interval = interval
+        self.thread: threading.Thread = None
+        self.error: BaseException = None
+
+    def due(self, round_count:int) -> bool:
+        return round_count % self.interval == 0
+
+    def save(self, genomes:List[Genome], state:dict) -> None:
+        # Keep a single write in flight, a newer checkpoint never gets
+        # replaced by an older one finishing late
+        self.wait()
+
+        self.thread = threading.Thread(target=self.write, args=(list(genomes), state))
+        self.thread.start()
+
+    def write(self, genomes:List[Genome], state:dict) -> None:
+        try:
+            write_checkpoint(self.path, genomes, state)
+        except BaseException as error:
+            self.error = error
+
+    def wait(self) -> None:
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"Writing checkpoint {self.path} failed") from error
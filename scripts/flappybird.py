@@ -1,13 +1,18 @@
 import random
-import time
-import json
 import sys
-
-
-from .utilities import ProgressBar
-from dataclasses import dataclass
-from scripts.NEAT import Genome, genome_feed_data, connection_weight_random_add,\
-                         connection_mutations, insert_node_mutations
+import numpy as np
+
+
+from .utilities import ProgressBar, EntityPool
+from .checkpoint import CheckpointWriter, dump_random_state, load_random_state
+from .population_manager import DefaultMaxPopulation, PopulationManager, RetirePolicy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Deque, Iterator
+from scripts.NEAT import Genome, CompiledGenome, GenomeBatch,\
+                         connection_weight_random_add, sample_mutations,\
+                         innovations, save_genomes
 from .pygame_foundation import *
 
 
@@ -18,6 +23,46 @@ class Ground:
     bottom_ground: Tuple[float, float, float]
 
 
+class PipeCourse:
+    """
+    Whole pipe sequence of an episode drawn up front, pipe i has the gap
+    gaps[i] and the center offset ys[i]. The same course can be replayed
+    by later generations and sent to other processes as plain arrays.
+    """
+    # Max score of an episode plus the pipes already on screen
+    Length = 1010
+
+    def __init__(self, gaps, ys) -> None:
+        self.gaps = np.asarray(gaps, dtype=np.int64)
+        self.ys = np.asarray(ys, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.gaps)
+
+    @staticmethod
+    def generate(gaps, ground_y_list, length, rng:random.Random=random) -> "PipeCourse":
+        course = PipeCourse([], [])
+        course.extend(gaps, ground_y_list, length, rng)
+        return course
+
+    def extend(self, gaps, ground_y_list, length, rng:random.Random=random):
+        """
+        Draw length more pipes, None entries of ground_y_list are drawn
+        from rng
+        """
+        start = len(self)
+        new_gaps = [gaps[i % len(gaps)] for i in range(start, start + length)]
+        new_ys = []
+        for i in range(start, start + length):
+            ground_y = ground_y_list[i % len(ground_y_list)]
+            if ground_y is None:
+                ground_y = rng.randint(-150, 150)
+            new_ys.append(ground_y)
+
+        self.gaps = np.concatenate((self.gaps, np.asarray(new_gaps, dtype=np.int64)))
+        self.ys = np.concatenate((self.ys, np.asarray(new_ys, dtype=np.int64)))
+
+
 class Grounds(Entity):
     @staticmethod
     def AABB_vs_circle(aabb:Rect, center:Vector, radius) -> bool:
@@ -33,7 +78,8 @@ class Grounds(Entity):
         return True
 
     def __init__(self, max_y, min_y, screen_size, spawn_interval, gaps,
-                 ground_y_list, move_speed) -> None:
+                 ground_y_list, move_speed, rng:random.Random=random,
+                 fixed_course=False, course:PipeCourse=None) -> None:
         self.max_y = max_y
         self.min_y = min_y
         self.screen_size = screen_size
@@ -41,46 +87,48 @@ class Grounds(Entity):
         self.spawn_interval = spawn_interval
         self.spawn_interval_timer = spawn_interval - 1
         self.gaps = gaps
-        self.gap_index = 0
-        self.grounds: List[Ground] = []
-
         self.ground_y_list = ground_y_list
-        self.ground_y_index = 0
+        # Grounds on screen ordered by x, so the oldest is always at the
+        # front and the nearest ones to the birds are the first few
+        self.grounds: Deque[Ground] = deque()
 
         self.move_speed = move_speed
-        self.birds: List["Bird"] = None
-
-    @property
-    def gap(self):
-        gap = self.gaps[self.gap_index]
+        self.random = rng
 
-        self.gap_index += 1
-        if self.gap_index >= len(self.gaps):
-            self.gap_index = 0
+        # With a fixed course every episode replays the same pipes
+        self.fixed_course = fixed_course
+        self.course = course
+        if course is None:
+            self.course = PipeCourse.generate(gaps, ground_y_list, PipeCourse.Length, rng)
+        self.course_index = 0
 
-        return gap
-
-    @property
-    def groud_y(self):
-        ground_y = self.ground_y_list[self.ground_y_index]
+        # Living birds only, dead ones are compacted out every update
+        self.birds: List["Bird"] = None
+        self.game: "FlappyBirdGame" = None
 
-        self.ground_y_index += 1
-        if self.ground_y_index >= len(self.ground_y_list):
-            self.ground_y_index = 0
-        
-        if ground_y is None:
-            ground_y = random.randint(-150, 150)
-        
-        return ground_y
+    def nearby(self, x, radius) -> Iterator[Ground]:
+        """
+        Grounds overlapping the column from x - radius to x + radius
+        """
+        for ground in self.grounds:
+            if ground.x_offset > x + radius:
+                break
+            if ground.x_offset + ground.up_ground[1] >= x - radius:
+                yield ground
 
-    def update(self, delta_time: float):
+    def spawn(self, delta_time: float):
         self.spawn_interval_timer += delta_time
         if self.spawn_interval_timer > self.spawn_interval:
             self.spawn_interval_timer = 0
 
-            y = (self.screen_size[1] / 2) + self.groud_y
+            if self.course_index >= len(self.course):
+                self.course.extend(self.gaps, self.ground_y_list,
+                                   PipeCourse.Length, self.random)
+
+            y = (self.screen_size[1] / 2) + int(self.course.ys[self.course_index])
+            gap = int(self.course.gaps[self.course_index])
+            self.course_index += 1
 
-            gap = self.gap
             self.grounds.append(
                 Ground(
                     self.screen_size[0] - 10,
@@ -88,6 +136,17 @@ class Grounds(Entity):
                     (y + gap, 30, self.screen_size[1]),
                     ))
 
+    def move(self, delta_time: float) -> bool:
+        """
+        Move grounds, returns whether the front ground passed the left edge
+        """
+        for ground in self.grounds:
+            ground.x_offset += self.move_speed * delta_time
+        return len(self.grounds) > 0 and self.grounds[0].x_offset < 0
+
+    def update(self, delta_time: float):
+        self.spawn(delta_time)
+
         # Check up ground and bottom ground
         for bird in self.birds:
             if bird.alive:
@@ -96,14 +155,10 @@ class Grounds(Entity):
                 elif bird.position[1] + bird.collider_size > self.max_y:
                     bird.kill()
 
-        # Move ground and check collision
-        remove = None
-        for i, ground in enumerate(self.grounds):
-            ground.x_offset += self.move_speed * delta_time
-            if ground.x_offset < 0:
-                remove = i
-
-            for bird in self.birds:
+        # Move ground and check collision against the nearby grounds only
+        passed = self.move(delta_time)
+        for bird in self.birds:
+            for ground in self.nearby(bird.position[0], bird.collider_size):
                 if bird.alive:
                     if self.AABB_vs_circle((ground.x_offset,
                                             *ground.up_ground),
@@ -114,10 +169,12 @@ class Grounds(Entity):
                                             *ground.bottom_ground),
                                            bird.position, bird.collider_size):
                         bird.kill()
+
+        self.birds[:] = [bird for bird in self.birds if bird.alive]
         
-        if remove is not None:
-            FlappyBirdGame.Score += 1
-            self.grounds.pop(remove)
+        if passed:
+            self.game.score += 1
+            self.grounds.popleft()
 
     def draw(self, window: ManagedWindow):
         pygame.draw.line(window.surface, Color.GREEN, (0, self.min_y), (self.screen_size[0], self.min_y))
@@ -129,8 +186,26 @@ class Grounds(Entity):
 
     def reset(self):
         self.grounds.clear()
-        self.gap_index = 0
-        self.ground_y_index = 0
+        self.course_index = 0
+        if not self.fixed_course:
+            self.course = PipeCourse.generate(self.gaps, self.ground_y_list,
+                                              PipeCourse.Length, self.random)
+
+    def detached_copy(self) -> "Grounds":
+        """
+        Copy of the grounds with its own random generator in the same state,
+        without birds or game, so it can be sent to another process.
+        """
+        grounds = Grounds(self.max_y, self.min_y, self.screen_size,
+                          self.spawn_interval, self.gaps, self.ground_y_list,
+                          self.move_speed, rng=random.Random(),
+                          fixed_course=self.fixed_course, course=self.course)
+        grounds.random.setstate(self.random.getstate())
+
+        grounds.spawn_interval_timer = self.spawn_interval_timer
+        grounds.course_index = self.course_index
+        grounds.grounds = deque(replace(ground) for ground in self.grounds)
+        return grounds
 
 class Bird(Entity):
     Gravity = 400
@@ -142,6 +217,10 @@ class Bird(Entity):
 
         self.alive = True
         self.velocity = 0
+        self.game: "FlappyBirdGame" = None
+
+        # Network outputs held between decision ticks
+        self.held_results = None
     
     def kill(self) -> None:
         self.alive = False
@@ -168,23 +247,45 @@ class GenomeBird(Bird):
     def __init__(self, genome:Genome, collider_size: int, position: Vector) -> None:
         super().__init__(collider_size, position)
         self.genome = genome
+        self.network = CompiledGenome(genome)
+        self.batch_index = None
         self.score = 0
         self.dropping = False
+
+    def rebind(self, genome:Genome, position:Vector) -> None:
+        """
+        Reuse the bird for another genome, as if it was just constructed
+        """
+        self.genome = genome
+        self.network = CompiledGenome(genome)
+        self.batch_index = None
+        self.score = 0
+        self.dropping = False
+
+        self.position = position
+        self.alive = True
+        self.velocity = 0
+        self.held_results = None
     
     def kill(self) -> None:
         super().kill()
-        self.score = time.time()
+        # Fitness is the tick of death, the later the better
+        self.score = self.game.tick_count
 
-    def update(self, delta_time: float):
-        self.velocity += self.Gravity * delta_time
-
-        results = genome_feed_data(genome=self.genome, inputs=[
+    def sensor_inputs(self) -> List[float]:
+        return [
             # self.position[0],
             self.position[1],
             # self.collider_size,
-            FlappyBirdGame.UpGroundY,
-            FlappyBirdGame.BottomGroundY,
-        ])
+            self.game.up_ground_y,
+            self.game.bottom_ground_y,
+        ]
+
+    def update(self, delta_time: float, results=None):
+        self.velocity += self.Gravity * delta_time
+
+        if results is None:
+            results = self.network.feed(self.sensor_inputs())
         if results[0] > 0:
             self.velocity = self.JumpForce
 
@@ -202,129 +303,481 @@ class GenomeBird(Bird):
                 pygame.draw.circle(window.surface, Color.GREEN, self.position, self.collider_size, 1)
 
 
-class FlappyBirdGame(ManagedWindow):
-    UpGroundY = 0
-    BottomGroundY = 0
-    Score = 0
+class FlappyBirdSimulation:
+    """
+    Headless flappy bird episode for a whole population, bird states are
+    arrays and every physics step runs as one array operation per tick.
+    Matches GenomeBird and Grounds.update for the same pipe heights.
+    """
+
+    def __init__(self, genomes: List[Genome], grounds: Grounds,
+                 collider_size=20, position: Vector=(40, 250),
+                 decision_interval=1, profiler=NULL_PROFILER) -> None:
+        self.grounds = grounds
+        self.profiler = profiler
+        if decision_interval < 1:
+            raise ValueError(f"decision_interval must be at least 1, not {decision_interval}")
+        self.batch = GenomeBatch(genomes)
+
+        self.decision_interval = decision_interval
+        self.results = np.zeros((len(genomes), self.batch.output_count), dtype=np.float64)
+        self.network_evaluations = 0
+
+        self.collider_size = collider_size
+        self.x = position[0]
+        self.y = np.full(len(genomes), position[1], dtype=np.float64)
+        self.velocity = np.zeros(len(genomes), dtype=np.float64)
+        self.alive = np.ones(len(genomes), dtype=bool)
+        self.death_tick = np.full(len(genomes), -1, dtype=np.int64)
+
+        # Indexes of the living birds, compacted on every kill so per tick
+        # work only scales with the birds still alive
+        self.rows = np.arange(len(genomes))
+
+        self.tick = 0
+        self.score = 0
+
+    def kill(self, mask: np.ndarray):
+        """
+        Kill the living birds selected by mask, a bool array over rows
+        """
+        if not mask.any():
+            return
+
+        dead = self.rows[mask]
+        self.alive[dead] = False
+        self.death_tick[dead] = self.tick
+        self.rows = self.rows[~mask]
+
+    def collide(self, rect: Rect):
+        # Every bird shares the same x, only the y test is per bird
+        if self.x + self.collider_size < rect[0]:
+            return
+        if self.x - self.collider_size > (rect[0] + rect[2]):
+            return
+
+        y = self.y[self.rows]
+        self.kill(~((y + self.collider_size < rect[1]) |
+                    (y - self.collider_size > (rect[1] + rect[3]))))
+
+    def step(self, delta_time: float):
+        grounds = self.grounds
+
+        # Same order as Grounds.update followed by FlappyBirdGame.update
+        with self.profiler.phase("collision"):
+            grounds.spawn(delta_time)
+
+            y = self.y[self.rows]
+            self.kill((y - self.collider_size < grounds.min_y) |
+                      (y + self.collider_size > grounds.max_y))
+
+            passed = grounds.move(delta_time)
+            for ground in grounds.nearby(self.x, self.collider_size):
+                self.collide((ground.x_offset, *ground.up_ground))
+                self.collide((ground.x_offset, *ground.bottom_ground))
+
+        if passed:
+            self.score += 1
+            grounds.grounds.popleft()
+
+        if len(grounds.grounds) == 0:
+            up_ground_y = 200
+            bottom_ground_y = 300
+        else:
+            up_ground_y = grounds.grounds[0].up_ground[0] + grounds.grounds[0].up_ground[2]
+            bottom_ground_y = grounds.grounds[0].bottom_ground[0]
+
+        rows = self.rows
+        if len(rows) > 0:
+            y = self.y[rows]
+            velocity = self.velocity[rows] + Bird.Gravity * delta_time
+
+            if self.tick % self.decision_interval == 0:
+                with self.profiler.phase("network"):
+                    inputs = np.empty((len(rows), 3), dtype=np.float64)
+                    inputs[:, 0] = y
+                    inputs[:, 1] = up_ground_y
+                    inputs[:, 2] = bottom_ground_y
+                    results = self.batch.feed(inputs, rows)
+
+                self.results[rows] = results
+                self.network_evaluations += len(rows)
+            else:
+                results = self.results[rows]
+
+            with self.profiler.phase("physics"):
+                velocity = np.where(results[:, 0] > 0, Bird.JumpForce, velocity)
+                velocity = np.where(results[:, 1] > 0, velocity + Bird.Gravity * delta_time, velocity)
+
+                self.velocity[rows] = velocity
+                self.y[rows] = y + velocity * delta_time
+
+        self.tick += 1
 
+    def run(self, delta_time: float, max_score=1000):
+        """
+        Step until every bird is dead or the score goes over max_score,
+        birds still alive get the last tick as their death tick.
+        """
+        while len(self.rows) > 0 and self.score <= max_score:
+            self.step(delta_time)
+
+        self.death_tick[self.alive] = self.tick
+
+
+def simulate_shard(networks: List[CompiledGenome], grounds: Grounds,
+                   collider_size, position: Vector, delta_time: float,
+                   decision_interval=1, max_score=1000, profiler=NULL_PROFILER):
+    """
+    Process pool job running one shard of the population, returns the
+    simulation results and the state of the grounds random generator.
+    """
+    simulation = FlappyBirdSimulation(networks, grounds, collider_size, position,
+                                      decision_interval, profiler)
+    simulation.run(delta_time, max_score)
+
+    return (simulation.alive, simulation.death_tick, simulation.score,
+            simulation.tick, grounds.random.getstate(),
+            simulation.network_evaluations)
+
+
+class FlappyBirdGame(ManagedWindow):
     def __init__(self, pygame_running, tick_limit=False, gaps=[80],
-                 ground_y_list=[None, None, None, -150, 150, -150]) -> None:
+                 ground_y_list=[None, None, None, -150, 150, -150],
+                 vectorized=False, seed=None, workers=1,
+                 decision_interval=1, fixed_course=False, checkpoint_path=None,
+                 checkpoint_interval=10, max_population=DefaultMaxPopulation, memory_budget=None,
+                 retire_policy=RetirePolicy.Worst) -> None:
         super().__init__((300, 500), step_update=False, tick=30, tick_limit=tick_limit)
 
+        # Every random draw of the game goes through its own generator,
+        # so games with the same seed play out bit identical
+        self.random = random.Random(seed)
+
+        self.score = 0
+        self.tick_count = 0
+        self.up_ground_y = 0
+        self.bottom_ground_y = 0
+
         self.grounds = Grounds(
             max_y=480, min_y=20, screen_size=(300, 500), spawn_interval=2.5,
             gaps=gaps, ground_y_list=ground_y_list,
-            move_speed=-100)
+            move_speed=-100, rng=self.random, fixed_course=fixed_course)
         self.children.append(self.grounds)
 
         self.birds: List[GenomeBird] = []
-        self.grounds.birds = self.birds
+        # Same order as birds, Grounds drops the dead ones every tick
+        self.alive_birds: List[GenomeBird] = []
+        self.grounds.birds = self.alive_birds
+        self.grounds.game = self
+        self.genome_batch: GenomeBatch = None
+        self.bird_pool = EntityPool(lambda genome, position: GenomeBird(genome, 20, position))
+        self.population_manager = PopulationManager(max_population, memory_budget, retire_policy)
 
         self.pygame_running = pygame_running
+        self.vectorized = vectorized or workers > 1
+        self.workers = workers
+
+        # Query the networks every decision_interval ticks and hold their
+        # outputs in between
+        if decision_interval < 1:
+            raise ValueError(f"decision_interval must be at least 1, not {decision_interval}")
+        self.decision_interval = decision_interval
+        self.network_evaluations = 0
 
         if not pygame_running:
             self.progress_bar = ProgressBar(1000, length=100)
 
         self.last_best_score = 0
         self.round_since_last_best_score_refresh = 0
+        self.total_round = 0
+
+        self.checkpoint_writer: CheckpointWriter = None
+        if checkpoint_path and checkpoint_interval > 0:
+            self.checkpoint_writer = CheckpointWriter(checkpoint_path, checkpoint_interval)
+
+    def add_bird(self, bird: Bird):
+        bird.game = self
+        self.birds.append(bird)
+        if bird.alive:
+            self.alive_birds.append(bird)
 
     def update(self, delta_time: float):
         if len(self.grounds.grounds) == 0:
-            FlappyBirdGame.UpGroundY = 200
-            FlappyBirdGame.BottomGroundY = 300
+            self.up_ground_y = 200
+            self.bottom_ground_y = 300
         else:
-            FlappyBirdGame.UpGroundY = self.grounds.grounds[0].up_ground[0] + self.grounds.grounds[0].up_ground[2]
-            FlappyBirdGame.BottomGroundY = self.grounds.grounds[0].bottom_ground[0]
+            self.up_ground_y = self.grounds.grounds[0].up_ground[0] + self.grounds.grounds[0].up_ground[2]
+            self.bottom_ground_y = self.grounds.grounds[0].bottom_ground[0]
+
+        alive_birds = list(self.alive_birds)
+        if self.tick_count % self.decision_interval == 0:
+            with self.profiler.phase("network"):
+                results = self.feed_genome_birds(alive_birds)
+            for bird, result in zip(alive_birds, results):
+                bird.held_results = result
+            self.network_evaluations += len(alive_birds)
+            self.profiler.count("evaluations", len(alive_birds))
+        else:
+            results = [bird.held_results for bird in alive_birds]
 
-        all_dead = True
-        for bird in self.birds:
-            if bird.alive:
-                bird.update(delta_time)
+        with self.profiler.phase("physics"):
+            for bird, result in zip(alive_birds, results):
+                if result is None:
+                    bird.update(delta_time)
+                else:
+                    bird.update(delta_time, result)
 
                 if self.pygame_running:
                     bird.draw(self)
-                all_dead = False
 
-        if all_dead:
+        self.tick_count += 1
+        self.profiler.count("ticks")
+
+        if len(alive_birds) == 0:
             self.reset()
         
-        if self.Score > 1000:
-            for bird in self.birds:
-                if bird.alive:
-                    with open("result.json", "w") as f:
-                        json.dump(bird.genome, f, default=lambda obj: obj.toJSON(), indent=4)
-
-                    if self.pygame_running:
-                        pygame.quit()
-                    sys.exit()
-                    break
+        if self.score > 1000 and len(self.alive_birds) > 0:
+            with self.profiler.phase("save"):
+                save_genomes("result.npz", [self.alive_birds[0].genome])
+
+            if self.pygame_running:
+                pygame.quit()
+            sys.exit()
+
+    def feed_genome_birds(self, birds: List[Bird]) -> List[np.ndarray]:
+        results = [None] * len(birds)
+        genome_birds = [i for i, bird in enumerate(birds) if isinstance(bird, GenomeBird)]
+        if len(genome_birds) == 0:
+            return results
+
+        if self.genome_batch is None or any(birds[i].batch_index is None for i in genome_birds):
+            population = [bird for bird in self.birds if isinstance(bird, GenomeBird)]
+            for i, bird in enumerate(population):
+                bird.batch_index = i
+            self.genome_batch = GenomeBatch([bird.network for bird in population])
+
+        inputs = [birds[i].sensor_inputs() for i in genome_birds]
+        rows = [birds[i].batch_index for i in genome_birds]
+        outputs = self.genome_batch.feed(inputs, rows)
+
+        for i, output in zip(genome_birds, outputs):
+            results[i] = output
+        return results
 
     def reset(self):
+        self.genome_batch = None
+
         if len(self.birds) == 1 and "score" not in self.birds[0].__dict__:
             self.birds[0].position = (40, 250)
             self.birds[0].velocity = 0
             self.birds[0].alive = True
+            self.alive_birds[:] = self.birds
 
             self.grounds.spawn_interval_timer = self.grounds.spawn_interval - 1
-            self.grounds.grounds.clear()
+            self.grounds.reset()
 
-            FlappyBirdGame.Score = 0
+            self.score = 0
+            self.tick_count = 0
             return
 
         best_birds = sorted(self.birds, key=lambda bird: bird.score, reverse=True)
 
         if not self.pygame_running:
-            # print(FlappyBirdGame.Score, self.progress_bar.progress_length)
-            self.progress_bar.set_progress(FlappyBirdGame.Score)
+            # print(self.score, self.progress_bar.progress_length)
+            self.progress_bar.set_progress(self.score)
 
-        if FlappyBirdGame.Score > self.last_best_score:
-            self.last_best_score = FlappyBirdGame.Score
+        if self.score > self.last_best_score:
+            self.last_best_score = self.score
             self.round_since_last_best_score_refresh = 0
         else:
             self.round_since_last_best_score_refresh += 1
 
-        if self.round_since_last_best_score_refresh > 10:
-            best_birds = best_birds[:10]
+        with self.profiler.phase("reproduction"):
+            if self.round_since_last_best_score_refresh > 10:
+                best_birds = best_birds[:10]
 
-            self.round_since_last_best_score_refresh = 0
+                self.round_since_last_best_score_refresh = 0
+
+                # The birds of this round stay, dead and with their score,
+                # as long as the population manager has room for them
+                carried = [bird for bird in self.birds if isinstance(bird, GenomeBird)]
+                offspring = []
 
-            for bird in best_birds:
-                mutations = connection_mutations(bird.genome, -4, 4)
-                mutations += insert_node_mutations(bird.genome)
-                mutations = random.choices(mutations, k=10)
+                innovations.new_generation()
+                for bird in best_birds:
+                    mutations = sample_mutations(bird.genome, 10, -4, 4, rng=self.random)
 
-                for genome in mutations:
-                    variants = connection_weight_random_add(genome, 20, -4, 4)
+                    for genome in mutations:
+                        variants = connection_weight_random_add(genome, 20, -4, 4, rng=self.random)
+                        for variant in variants:
+                            offspring.append(self.bird_pool.acquire(variant, (40, 250)))
+
+            else:
+                best_genomes = [bird.genome for bird in best_birds[:40]]
+                self.bird_pool.release([bird for bird in self.birds if isinstance(bird, GenomeBird)])
+                carried = []
+                offspring = []
+
+                for genome in best_genomes:
+                    variants = connection_weight_random_add(genome, 40, -4, 4, rng=self.random)
                     for variant in variants:
-                        bird = GenomeBird(variant, 20, (40, 250))
-                        # bird.position = (40, 250)
-                        bird.velocity = 0
-                        self.birds.append(bird)
+                        offspring.append(self.bird_pool.acquire(variant, (40, 250)))
 
-        else:
-            best_birds = best_birds[:40]
-            self.birds.clear()
+            population, retired = self.population_manager.limit(carried, offspring)
+            self.bird_pool.release(retired)
+            # A spike in population size doesn't keep its birds around
+            self.bird_pool.trim(len(population))
 
-            for bird in best_birds:
-                variants = connection_weight_random_add(bird.genome, 40, -4, 4)
-                for variant in variants:
-                    bird = GenomeBird(variant, 20, (40, 250))
-                    # bird.position = (40, 250)
-                    bird.velocity = 0
-                    self.birds.append(bird)
+            self.birds.clear()
+            self.alive_birds.clear()
+            for bird in population:
+                self.add_bird(bird)
 
         self.grounds.spawn_interval_timer = self.grounds.spawn_interval - 1
         self.grounds.reset()
 
-        FlappyBirdGame.Score = 0
+        self.alive_birds[:] = [bird for bird in self.birds if bird.alive]
+
+        score = self.score
+        self.score = 0
+        self.tick_count = 0
+
+        self.total_round += 1
+        if self.checkpoint_writer is not None and self.checkpoint_writer.due(self.total_round):
+            with self.profiler.phase("checkpoint"):
+                self.checkpoint_writer.save([bird.genome for bird in self.birds],
+                                            self.checkpoint_state())
+
+        self.profiler.end_generation(round=self.total_round, score=score,
+                                     **self.population_manager.report)
+
+    def checkpoint_state(self) -> dict:
+        """
+        Everything besides the genomes needed to continue training from the
+        start of the next round
+        """
+        return {
+            "game": "flappybird",
+            "total_round": self.total_round,
+            "last_best_score": self.last_best_score,
+            "round_since_last_best_score_refresh": self.round_since_last_best_score_refresh,
+            "network_evaluations": self.network_evaluations,
+            "random": dump_random_state(self.random),
+            "innovations": innovations.getstate(),
+            "course": [self.grounds.course.gaps.tolist(), self.grounds.course.ys.tolist()],
+            # Birds kept from the last round stay dead with their old score
+            "birds": [[bird.alive, bird.score] for bird in self.birds],
+        }
+
+    def restore_checkpoint(self, genomes: List[Genome], state: dict):
+        if state["game"] != "flappybird":
+            raise ValueError(f"Checkpoint is from {state['game']}, not flappybird")
+
+        self.birds.clear()
+        self.alive_birds.clear()
+        for genome, (alive, score) in zip(genomes, state["birds"]):
+            bird = self.bird_pool.acquire(genome, (40, 250))
+            bird.alive = alive
+            bird.score = score
+            self.add_bird(bird)
+        self.genome_batch = None
+
+        self.total_round = state["total_round"]
+        self.last_best_score = state["last_best_score"]
+        self.round_since_last_best_score_refresh = state["round_since_last_best_score_refresh"]
+        self.network_evaluations = state["network_evaluations"]
+        load_random_state(state["random"], self.random)
+        innovations.setstate(state["innovations"])
+
+        # Not Grounds.reset, which would draw a new course
+        self.grounds.grounds.clear()
+        self.grounds.course = PipeCourse(*state["course"])
+        self.grounds.course_index = 0
+        self.grounds.spawn_interval_timer = self.grounds.spawn_interval - 1
+        self.score = 0
+        self.tick_count = 0
+
+    def evaluate_population(self, delta_time: float, executor: ProcessPoolExecutor=None):
+        """
+        Run one episode of the whole population as arrays, sharded over the
+        executor when given. Every shard plays the same pipe course, which
+        is why the results equal a single simulation of the population.
+        """
+        collider_size = self.birds[0].collider_size
+        position = self.birds[0].position
+        networks = [bird.network for bird in self.birds]
+
+        if executor is None:
+            shards = [simulate_shard(networks, self.grounds, collider_size,
+                                     position, delta_time, self.decision_interval,
+                                     profiler=self.profiler)]
+        else:
+            futures = []
+            for indexes in np.array_split(np.arange(len(networks)), self.workers):
+                if len(indexes) == 0:
+                    continue
+
+                futures.append(executor.submit(
+                    simulate_shard, [networks[i] for i in indexes],
+                    self.grounds.detached_copy(), collider_size, position,
+                    delta_time, self.decision_interval))
+            shards = [future.result() for future in futures]
+
+        alive = np.concatenate([shard[0] for shard in shards])
+        death_tick = np.concatenate([shard[1] for shard in shards])
+        for bird, bird_alive, bird_death_tick in zip(self.birds, alive.tolist(), death_tick.tolist()):
+            bird.alive = bird_alive
+            bird.score = bird_death_tick
+
+        # The longest running shard drew the same pipes a single simulation
+        # would have, continue from its random state
+        longest = max(shards, key=lambda shard: shard[3])
+        self.score = longest[2]
+        self.tick_count = longest[3]
+        self.random.setstate(longest[4])
+
+        self.network_evaluations += sum(shard[5] for shard in shards)
+        self.profiler.count("ticks", self.tick_count)
+        self.profiler.count("evaluations", sum(shard[5] for shard in shards))
+
+    def run_vectorized(self):
+        delta_time = 1 / self.tick
+
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        try:
+            while True:
+                with self.profiler.phase("simulation"):
+                    self.evaluate_population(delta_time, executor)
+
+                if self.score > 1000:
+                    for bird in self.birds:
+                        if bird.alive:
+                            with self.profiler.phase("save"):
+                                save_genomes("result.npz", [bird.genome])
+                            sys.exit()
+
+                self.reset()
+        finally:
+            # Also on KeyboardInterrupt, or the worker processes outlive training
+            if executor is not None:
+                executor.shutdown()
 
     def run_without_pygame(self):
         self.progress_bar.set_progress(0)
         delta_time = 1 / self.tick
 
+        if self.vectorized:
+            self.run_vectorized()
+            return
+
         while True:
-            for child in self.children:
-                child.update(delta_time)
+            with self.profiler.phase("collision"):
+                for child in self.children:
+                    child.update(delta_time)
             
             self.update(delta_time)
 
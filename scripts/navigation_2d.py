@@ -1,17 +1,24 @@
 import random
 # import pygame
 import math
-import json
 import os
-
-from scripts.NEAT.functions import connection_mutations, insert_node_mutations
-from .utilities import ProgressBar
+import json
+import numpy as np
+
+from scripts.NEAT.functions import sample_mutations
+from scripts.NEAT.innovation import innovations
+from .utilities import ProgressBar, EntityPool
+from .checkpoint import CheckpointWriter, dump_random_state, load_random_state
+from .population_manager import DefaultMaxPopulation, PopulationManager, RetirePolicy
+from .spatial_grid import UniformGrid
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from .NEAT import Genome, genome_feed_data, connection_weight_random_add
+from .NEAT import Genome, CompiledGenome, GenomeBatch, connection_weight_random_add,\
+                   save_genomes
 from .pygame_foundation import Color, Entity, InputSystem, KeyCode, Math, Vector
 from .NEAT_pygame import NEATManagedWindow
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
 
 
 class HitType(Enum):
@@ -20,6 +27,81 @@ class HitType(Enum):
     Food = 2
 
 
+class RaycastMode(Enum):
+    # March the ray in 3 pixel steps testing everything at every step
+    Stepped = 0
+    # Same hit and hit point as Stepped, the first hit step is solved in
+    # closed form so only that step gets tested
+    Quantized = 1
+    # Exact nearest hit point and distance along the ray
+    Analytic = 2
+
+
+# Pixels per step of a stepped raycast
+RaycastStep = 3
+
+# Angle of every sensor ray relative to the character rotation, -45 to 45
+# every 15 scaled down by 60
+RayAngles = np.asarray([rotation_delta / 60 for rotation_delta in range(-45, 45 + 1, 15)])
+
+# Largest and smallest pixels per cell of the wall and food grids, cells
+# shrink in crowded arenas to keep a few obstacles per cell
+SpatialIndexCellSize = 20
+SpatialIndexMinCellSize = 4
+# Walls and foods an arena needs before raycasts look them up in the grids
+# instead of testing every one
+SpatialIndexThreshold = 32
+
+
+def first_step_at_most(value, delta, limit):
+    """
+    Smallest step k >= 1 where value + k * delta <= limit, or None
+    """
+    if delta == 0:
+        return 1 if value <= limit else None
+
+    bound = (limit - value) / delta
+    if delta < 0:
+        return max(1, math.ceil(bound))
+    return 1 if bound >= 1 else None
+
+
+def open_interval(value, delta, start, end) -> Tuple[float, float]:
+    """
+    Range of k where start < value + k * delta < end
+    """
+    if delta == 0:
+        if start < value < end:
+            return -math.inf, math.inf
+        return math.inf, -math.inf
+
+    low = (start - value) / delta
+    high = (end - value) / delta
+    if low > high:
+        return high, low
+    return low, high
+
+
+def circle_interval(position:Vector, delta:Vector, center:Vector, radius) -> Tuple[float, float]:
+    """
+    Range of k where position + k * delta is within the circle, k1 > k2 if
+    the line misses it
+    """
+    offset_x = position[0] - center[0]
+    offset_y = position[1] - center[1]
+
+    a = delta[0] * delta[0] + delta[1] * delta[1]
+    b = 2 * (delta[0] * offset_x + delta[1] * offset_y)
+    c = offset_x * offset_x + offset_y * offset_y - radius * radius
+
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return math.inf, -math.inf
+
+    root = math.sqrt(discriminant)
+    return (-b - root) / (2 * a), (-b + root) / (2 * a)
+
+
 @dataclass
 class RaycastData:
     direction: Vector
@@ -40,23 +122,136 @@ class Food:
     radius: float
 
 
+@dataclass
+class ArenaLayout:
+    """
+    Walls, foods in the order they are eaten and the start position of an
+    arena. Every arena shares the 400x200 window and its borders.
+    """
+    walls: List[Wall] = field(default_factory=list)
+    foods: List[Food] = field(default_factory=list)
+    start: Vector = (50, 100)
+
+    @staticmethod
+    def default() -> "ArenaLayout":
+        # walls.append(Wall((40, 60), (100, 90)))
+        # walls.append(Wall((100, 300), (150, 400)))
+        return ArenaLayout(foods=[
+            Food((350, 100), 5),
+            Food((50, 100), 5),
+            Food((350, 150), 5),
+            Food((50, 150), 5),
+            Food((350, 50), 5),
+            Food((50, 50), 5),
+        ])
+
+    @staticmethod
+    def generate(seed, food_count=6, wall_count=4) -> "ArenaLayout":
+        """
+        Random arena of the seed, walls keep clear of the start and foods
+        keep clear of the walls, the start and each other
+        """
+        rng = random.Random(seed)
+        start = (rng.uniform(40, 360), rng.uniform(40, 160))
+
+        walls = []
+        for _ in range(wall_count * 20):
+            if len(walls) >= wall_count:
+                break
+
+            width = rng.uniform(10, 60)
+            height = rng.uniform(10, 60)
+            x = rng.uniform(10, 390 - width)
+            y = rng.uniform(10, 190 - height)
+            if x - 20 < start[0] < x + width + 20 and y - 20 < start[1] < y + height + 20:
+                continue
+            walls.append(Wall((x, y), (x + width, y + height)))
+
+        foods = []
+        for _ in range(food_count * 50):
+            if len(foods) >= food_count:
+                break
+
+            position = (rng.uniform(30, 370), rng.uniform(30, 170))
+            if Math.sqr_magnitude(position, start) < 40 * 40:
+                continue
+            if any(Math.sqr_magnitude(position, food.position) < 20 * 20 for food in foods):
+                continue
+            if any(wall.start_pos[0] - 10 < position[0] < wall.end_pos[0] + 10 and
+                   wall.start_pos[1] - 10 < position[1] < wall.end_pos[1] + 10 for wall in walls):
+                continue
+            foods.append(Food(position, 5))
+
+        return ArenaLayout(walls, foods, start)
+
+    def toJSON(self):
+        return {
+            "start": list(self.start),
+            "walls": [[*wall.start_pos, *wall.end_pos] for wall in self.walls],
+            "foods": [[*food.position, food.radius] for food in self.foods],
+        }
+
+    @staticmethod
+    def fromJSON(json):
+        if not isinstance(json.get("foods"), list) or len(json["foods"]) == 0:
+            raise ValueError("Arena layout needs at least one food")
+
+        return ArenaLayout(
+            walls=[Wall((start_x, start_y), (end_x, end_y))
+                   for start_x, start_y, end_x, end_y in json.get("walls", [])],
+            foods=[Food((x, y), radius) for x, y, radius in json["foods"]],
+            start=tuple(json.get("start", (50, 100))))
+
+
+def load_arena_layouts(file_path:str) -> List[ArenaLayout]:
+    """
+    Read a json list of arena layouts, as written by ArenaLayout.toJSON
+    """
+    with open(file_path) as file:
+        layouts = json.load(file)
+
+    if not isinstance(layouts, list):
+        raise ValueError(f"{file_path} is not a list of arena layouts")
+    return [ArenaLayout.fromJSON(layout) for layout in layouts]
+
+
+class FitnessAggregate(Enum):
+    # Average score over the arenas
+    Mean = 0
+    # Score of the worst arena, favours controllers that work everywhere
+    Min = 1
+
+
 class Character(Entity):
     def __init__(self, position:Vector, move_speed, rotation_speed=0.1) -> None:
         super().__init__()
 
         self.rotation_speed = rotation_speed
         self.move_speed = move_speed
-        self.position: Vector = position
+        self._position: Vector = position
 
         self._rotation = 0
         self.direction: Vector = (math.cos(0), math.sin(0))
         self.raycasts: List[RaycastData] = []
+        # Moving or turning only marks the raycasts stale, they are cast
+        # again when the sensors are read
+        self.sensors_dirty = True
 
         self.radius = 10
 
         self.game: NavigationGame = None
         self.food_count = 0
 
+    @property
+    def position(self) -> Vector:
+        return self._position
+
+    @position.setter
+    def position(self, value:Vector):
+        if value != self._position:
+            self._position = value
+            self.invalidate_sensors()
+
     @property
     def rotation(self):
         return self._rotation
@@ -65,24 +260,42 @@ class Character(Entity):
     def rotation(self, value):
         self._rotation = value
         self.direction = (math.cos(value), math.sin(value))
-        self.recalculate_raycasts()
+        self.invalidate_sensors()
+
+    def invalidate_sensors(self):
+        # A change to sensors that are already stale would have been a
+        # wasted cast, the batched sensors never cast on changes
+        if self.sensors_dirty and self.game is not None and not self.game.batched_sensors:
+            self.game.profiler.count("raycasts_saved", len(RayAngles))
+        self.sensors_dirty = True
+
+    def refresh_sensors(self):
+        if self.sensors_dirty:
+            self.recalculate_raycasts()
 
     def recalculate_raycasts(self):
-        self.raycasts.clear()
+        # NavigationGame.sense casts the rays of every stale character at once
+        if self.game.batched_sensors:
+            return
+
+        self.sensors_dirty = False
+        self.game.profiler.count("raycasts", len(RayAngles))
+        with self.game.profiler.phase("raycast"):
+            self.raycasts.clear()
 
-        # Shoot out raycast from relative angle -45 to 45 every 5 degree
-        for rotation_delta in range(-45, 45 + 1, 15):
-            angle = self._rotation + (rotation_delta / 60)
-            direction = (math.cos(angle), math.sin(angle))
+            # Shoot out raycast from relative angle -45 to 45 every 5 degree
+            for rotation_delta in range(-45, 45 + 1, 15):
+                angle = self._rotation + (rotation_delta / 60)
+                direction = (math.cos(angle), math.sin(angle))
 
-            # Add raycast info and result
-            type_, hit_point  = self.game.raycast(self.position, direction)
+                # Add raycast info and result
+                type_, hit_point  = self.game.raycast(self.position, direction)
 
-            self.raycasts.append(RaycastData(
-                direction,
-                hit_point,
-                type_,
-                Math.magnitude(self.position, hit_point)))
+                self.raycasts.append(RaycastData(
+                    direction,
+                    hit_point,
+                    type_,
+                    Math.magnitude(self.position, hit_point)))
 
     def update(self, delta_time: float):
         # Handle turning
@@ -99,10 +312,10 @@ class Character(Entity):
         if InputSystem.check_key_pressed(KeyCode.W):
             self.position = (self.position[0] + (self.direction[0] * self.move_speed * delta_time),
                             self.position[1] + (self.direction[1] * self.move_speed * delta_time))
-            self.recalculate_raycasts()
     
     def draw(self, window: NEATManagedWindow):
         import pygame
+        self.refresh_sensors()
         pygame.draw.circle(window.surface, Color.GREEN, self.position, self.radius, 2)
         # Draw facing
         # pygame.draw.line(window.surface, Color.YELLOW, self.position,
@@ -123,17 +336,37 @@ class GenomeCharacter(Character):
         super().__init__(position, move_speed)
 
         self.genome = genome
+        self.network = CompiledGenome(genome)
+        self.batch_index = None
         self.score = 0
 
-    def update(self, delta_time: float):
+    def rebind(self, genome:Genome, position:Vector) -> None:
+        """
+        Reuse the character for another genome, the raycasts are left to
+        NavigationGame.add_character
+        """
+        self.genome = genome
+        self.network = CompiledGenome(genome)
+        self.batch_index = None
+        self.score = 0
+
+        self._position = position
+        self._rotation = 0
+        self.direction = (math.cos(0), math.sin(0))
+        self.food_count = 0
+        self.sensors_dirty = True
+
+    def sensor_inputs(self) -> List[float]:
+        self.refresh_sensors()
         inputs = [self.position[0], self.position[1]]
         for racast in self.raycasts:
             inputs.append(racast.hit_type.value)
             inputs.append(racast.distance)
+        return inputs
 
-        results = genome_feed_data(
-            genome=self.genome,
-            inputs=inputs)
+    def update(self, delta_time: float, results=None):
+        if results is None:
+            results = self.network.feed(self.sensor_inputs())
 
         direction_changes = 0
         if results[0] > 0:
@@ -147,11 +380,39 @@ class GenomeCharacter(Character):
         if results[2]:
             self.position = (self.position[0] + (self.direction[0] * self.move_speed * delta_time),
                             self.position[1] + (self.direction[1] * self.move_speed * delta_time))
-            self.recalculate_raycasts()
+
+
+def evaluate_arena_shard(genomes: List[Genome], layout: ArenaLayout, delta_time: float,
+                         time_pass_limit, options: dict) -> Tuple[List[float], int, int]:
+    """
+    Process pool job playing one round of a shard of the population in one
+    arena, returns the scores, the ticks and the network evaluations.
+    options are NavigationGame keyword arguments.
+    """
+    game = NavigationGame(False, layout=layout, **options)
+    game.time_pass_limit = time_pass_limit
+    # A finished character waits for the others, so a score doesn't depend
+    # on who else is in the shard
+    game.end_round_on_finish = False
+
+    for genome in genomes:
+        game.add_character(GenomeCharacter(genome, layout.start, 10))
+
+    while not game.advance(delta_time):
+        pass
+
+    game.evaluate_character_score()
+    return ([character.score for character in game.characters],
+            game.tick_count, game.network_evaluations)
 
 
 class NavigationGame(NEATManagedWindow):
-    def __init__(self, run_pygame, tick_limit=False) -> None:
+    def __init__(self, run_pygame, tick_limit=False, decision_interval=1,
+                 checkpoint_path=None, checkpoint_interval=10, max_population=DefaultMaxPopulation,
+                 memory_budget=None, retire_policy=RetirePolicy.Worst,
+                 raycast_mode=RaycastMode.Quantized, batched_sensors=False,
+                 spatial_index=None, layout:ArenaLayout=None, arenas:List[ArenaLayout]=None,
+                 workers=1, arena_aggregate=FitnessAggregate.Mean) -> None:
         super().__init__(
             run_pygame=run_pygame,
             size=(400, 200),
@@ -162,31 +423,612 @@ class NavigationGame(NEATManagedWindow):
         self.max_y = 190
 
         self.characters: List[GenomeCharacter] = []
-        self.walls: List[Wall] = []
-
-        # self.walls.append(Wall((40, 60), (100, 90)))
-        # self.walls.append(Wall((100, 300), (150, 400)))
-
-        self.foods: List[Food] = []
-        self.foods.append(Food((350, 100), 5))
-        self.foods.append(Food((50, 100), 5))
-        self.foods.append(Food((350, 150), 5))
-        self.foods.append(Food((50, 150), 5))
-        self.foods.append(Food((350, 50), 5))
-        self.foods.append(Food((50, 50), 5))
+        self.genome_batch: GenomeBatch = None
+        # Batched sensor inputs of every character by batch index
+        self.sensor_matrix: np.ndarray = None
+        self.character_pool = EntityPool(lambda genome, position: GenomeCharacter(genome, position, 10))
+        self.population_manager = PopulationManager(max_population, memory_budget, retire_policy)
+
+        # Raycasts of every (position, rotation, raycast mode) characters
+        # started from, dropped whenever the walls or foods change
+        self.start_raycasts: Dict[Tuple[Vector, float, RaycastMode], List[RaycastData]] = {}
+        self.start_raycasts_key = None
+
+        if layout is None:
+            layout = ArenaLayout.default()
+        self.walls: List[Wall] = list(layout.walls)
+        self.foods: List[Food] = list(layout.foods)
+        self.start_position: Vector = layout.start
+
+        # Score every genome on each of the arenas instead of playing the
+        # layout above, arena x shard jobs run on workers processes. Only
+        # headless, pygame plays the layout above
+        self.arenas: List[ArenaLayout] = arenas if arenas is not None else []
+        self.workers = workers
+        self.arena_aggregate = arena_aggregate
+        self.network_evaluations = 0
+
+        self.raycast_mode = raycast_mode
+        # Cast the rays of every character as arrays when feeding the
+        # networks, instead of per character whenever one moves
+        self.batched_sensors = batched_sensors
+
+        # True or False to force the wall and food grids on or off, None uses
+        # them once the arena has more than SpatialIndexThreshold obstacles
+        self.spatial_index = spatial_index
+        self.spatial_index_key = None
+        self.grids: Tuple[UniformGrid, UniformGrid] = None
+        # Walls as (start x, start y, end x, end y) and foods as (x, y,
+        # radius) rows, for the batched raycasts
+        self.wall_array: np.ndarray = None
+        self.food_array: np.ndarray = None
 
         self.time_pass = 0
         self.time_pass_limit = 100
+        # Otherwise finished characters stop and the others play on until
+        # the time limit
+        self.end_round_on_finish = True
+        self.finished_count = 0
+
+        # Query the networks every decision_interval ticks and hold their
+        # outputs in between
+        if decision_interval < 1:
+            raise ValueError(f"decision_interval must be at least 1, not {decision_interval}")
+        self.decision_interval = decision_interval
+        self.tick_count = 0
+        self.held_results: np.ndarray = None
 
         self.progress_bar = ProgressBar(self.time_pass_limit, length=40)
 
+        self.checkpoint_writer: CheckpointWriter = None
+        if checkpoint_path and checkpoint_interval > 0:
+            self.checkpoint_writer = CheckpointWriter(checkpoint_path, checkpoint_interval)
+
     def add_character(self, character: Character):
         self.characters.append(character)
         character.game = self
-        character.recalculate_raycasts()
+
+        obstacle_key = self.obstacle_key()
+        if obstacle_key != self.start_raycasts_key:
+            self.start_raycasts.clear()
+            self.start_raycasts_key = obstacle_key
+
+        key = (character.position, character.rotation, self.raycast_mode)
+        if self.batched_sensors:
+            character.sensors_dirty = True
+        elif key in self.start_raycasts:
+            character.raycasts = list(self.start_raycasts[key])
+            character.sensors_dirty = False
+        else:
+            character.recalculate_raycasts()
+            self.start_raycasts[key] = list(character.raycasts)
+
+        self.genome_batch = None
+        self.held_results = None
+
+    def feed_genome_characters(self) -> List[np.ndarray]:
+        if len(self.characters) == 0:
+            return []
+
+        if self.genome_batch is None:
+            for i, character in enumerate(self.characters):
+                character.batch_index = i
+            self.genome_batch = GenomeBatch([character.network for character in self.characters])
+            self.sensor_matrix = None
+
+        if self.batched_sensors:
+            with self.profiler.phase("raycast"):
+                inputs = self.batched_sensor_inputs()
+        else:
+            inputs = [character.sensor_inputs() for character in self.characters]
+        rows = [character.batch_index for character in self.characters]
+        return self.genome_batch.feed(inputs, rows)
+
+    def batched_sensor_inputs(self) -> np.ndarray:
+        """
+        Network inputs of every character by batch index, only the rows of
+        characters that moved or turned since the last call are cast again
+        """
+        if self.sensor_matrix is None:
+            self.sensor_matrix = np.empty((len(self.characters), 2 + 2 * len(RayAngles)), dtype=np.float64)
+            stale = self.characters
+        else:
+            stale = [character for character in self.characters if character.sensors_dirty]
+
+        self.profiler.count("raycasts", len(stale) * len(RayAngles))
+        self.profiler.count("raycasts_saved", (len(self.characters) - len(stale)) * len(RayAngles))
+        if len(stale) > 0:
+            self.sensor_matrix[[character.batch_index for character in stale]] = self.sense(stale)
+        return self.sensor_matrix
+
+    def sense(self, characters: List[Character]) -> np.ndarray:
+        """
+        Network inputs of every character as an (n, 16) matrix, the same
+        columns as GenomeCharacter.sensor_inputs. All rays are cast at once.
+        """
+        count = len(characters)
+        origins = np.asarray([character.position for character in characters], dtype=np.float64)
+        rotations = np.asarray([character.rotation for character in characters], dtype=np.float64)
+        for character in characters:
+            character.sensors_dirty = False
+
+        angles = rotations[:, None] + RayAngles[None, :]
+        origin_x = np.repeat(origins[:, 0:1], len(RayAngles), axis=1).ravel()
+        origin_y = np.repeat(origins[:, 1:2], len(RayAngles), axis=1).ravel()
+        direction_x = np.cos(angles).ravel()
+        direction_y = np.sin(angles).ravel()
+
+        if self.raycast_mode == RaycastMode.Analytic:
+            hit_types, hit_x, hit_y = self.raycast_analytic_batch(
+                origin_x, origin_y, direction_x, direction_y)
+        else:
+            hit_types, hit_x, hit_y = self.raycast_stepped_batch(
+                origin_x, origin_y, direction_x, direction_y)
+
+        distances = np.sqrt((hit_x - origin_x) ** 2 + (hit_y - origin_y) ** 2)
+
+        inputs = np.empty((count, 2 + 2 * len(RayAngles)), dtype=np.float64)
+        inputs[:, 0:2] = [character.position for character in characters]
+        inputs[:, 2::2] = hit_types.reshape(count, len(RayAngles))
+        inputs[:, 3::2] = distances.reshape(count, len(RayAngles))
+
+        if self.run_pygame:
+            # Only drawing needs the per ray objects
+            hit_type_members = list(HitType)
+            for i, character in enumerate(characters):
+                character.raycasts = [
+                    RaycastData((direction_x[j], direction_y[j]), (hit_x[j], hit_y[j]),
+                                hit_type_members[hit_types[j]], distances[j])
+                    for j in range(i * len(RayAngles), (i + 1) * len(RayAngles))]
+
+        return inputs
+
+    def spatial_grids(self) -> Tuple[UniformGrid, UniformGrid]:
+        """
+        Wall and food grids of the arena, or None when it is small enough to
+        test everything. Rebuilt when walls or foods are added or removed,
+        call invalidate_spatial_index after moving one.
+        """
+        key = self.obstacle_key()
+        if key == self.spatial_index_key:
+            return self.grids
+        self.spatial_index_key = key
+
+        enabled = self.spatial_index
+        if enabled is None:
+            enabled = len(self.walls) + len(self.foods) > SpatialIndexThreshold
+        if not enabled:
+            self.grids = None
+            return None
+
+        bounds = (self.min_x, self.min_y, self.max_x, self.max_y)
+        area = (self.max_x - self.min_x) * (self.max_y - self.min_y)
+        cell_size = math.sqrt(area / max(len(self.walls) + len(self.foods), 1))
+        cell_size = min(max(cell_size, SpatialIndexMinCellSize), SpatialIndexCellSize)
+
+        wall_grid = UniformGrid(bounds, cell_size)
+        for wall in self.walls:
+            wall_grid.insert(wall, (*wall.start_pos, *wall.end_pos))
+
+        # Padded by a pixel so a point the distance test rounds into a food
+        # is still in one of its cells
+        food_grid = UniformGrid(bounds, cell_size)
+        for food in self.foods:
+            food_grid.insert(food, (food.position[0] - food.radius - 1, food.position[1] - food.radius - 1,
+                                    food.position[0] + food.radius + 1, food.position[1] + food.radius + 1))
+
+        self.wall_array = np.asarray([(*wall.start_pos, *wall.end_pos) for wall in self.walls],
+                                     dtype=np.float64).reshape(-1, 4)
+        self.food_array = np.asarray([(*food.position, food.radius) for food in self.foods],
+                                     dtype=np.float64).reshape(-1, 3)
+        self.grids = (wall_grid, food_grid)
+        return self.grids
+
+    def obstacle_key(self) -> Tuple[int, int, int, int]:
+        """
+        Changes when walls or foods are added or removed
+        """
+        return (id(self.walls), len(self.walls), id(self.foods), len(self.foods))
+
+    def invalidate_spatial_index(self):
+        self.spatial_index_key = None
+        self.start_raycasts.clear()
+
+    def obstacles_at(self, position:Vector) -> Tuple[List[Wall], List[Food]]:
+        """
+        Walls and foods that can contain the position, in arena order
+        """
+        grids = self.spatial_grids()
+        if grids is None:
+            return self.walls, self.foods
+        return grids[0].query_point(*position), grids[1].query_point(*position)
+
+    def obstacles_along(self, position:Vector, delta:Vector, length):
+        """
+        Walls and foods the segment from position to position + delta *
+        length can touch, in pieces of about a grid cell from the start of
+        the segment. Yields (reach, walls, foods), anything hit before reach
+        times delta is in the pieces so far, so a raycast can stop once it
+        has a nearer hit. An obstacle can be in more than one piece.
+        """
+        grids = self.spatial_grids()
+        if grids is None:
+            yield length, self.walls, self.foods
+            return
+
+        piece = grids[0].cell_size / max(math.hypot(delta[0], delta[1]), 1e-9)
+        start = 0
+        while start < length:
+            end = min(start + piece, length)
+            start_x = position[0] + delta[0] * start
+            start_y = position[1] + delta[1] * start
+            end_x = position[0] + delta[0] * end
+            end_y = position[1] + delta[1] * end
+
+            box = (min(start_x, end_x) - 1, min(start_y, end_y) - 1,
+                   max(start_x, end_x) + 1, max(start_y, end_y) + 1)
+            yield end, grids[0].query_box(box), grids[1].query_box(box)
+            start = end
+
+    def raycast_stepped_batch(self, origin_x:np.ndarray, origin_y:np.ndarray,
+                              direction_x:np.ndarray, direction_y:np.ndarray,
+                              max_distance=30) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        raycast_stepped over arrays of rays, returns hit type values and
+        hit points
+        """
+        grids = self.spatial_grids()
+        hit_types = np.zeros(len(origin_x), dtype=np.int8)
+        hit_x = np.empty(len(origin_x), dtype=np.float64)
+        hit_y = np.empty(len(origin_x), dtype=np.float64)
+
+        # Rays still marching, compacted as soon as some hit something
+        rays = np.arange(len(origin_x))
+        x = origin_x.copy()
+        y = origin_y.copy()
+        step_x = direction_x * RaycastStep
+        step_y = direction_y * RaycastStep
+        for _ in range(max_distance):
+            x += step_x
+            y += step_y
+
+            wall = (x <= self.min_x) | (y <= self.min_y) | (x >= self.max_x) | (y >= self.max_y)
+            food = np.zeros(len(rays), dtype=bool)
+            if grids is None:
+                for item in self.walls:
+                    wall |= (item.end_pos[0] > x) & (x > item.start_pos[0]) &\
+                            (item.end_pos[1] > y) & (y > item.start_pos[1])
+
+                for item in self.foods:
+                    offset_x = x - item.position[0]
+                    offset_y = y - item.position[1]
+                    food |= offset_x * offset_x + offset_y * offset_y <= item.radius * item.radius
+            else:
+                # Only test the (ray, obstacle) pairs sharing a cell, both
+                # grids have the same cells
+                cells = grids[0].cells_of(x, y)
+
+                owners, indexes = grids[0].pairs(np.arange(len(rays)), cells)
+                items = self.wall_array[indexes]
+                pair_x = x[owners]
+                pair_y = y[owners]
+                inside = (items[:, 2] > pair_x) & (pair_x > items[:, 0]) &\
+                         (items[:, 3] > pair_y) & (pair_y > items[:, 1])
+                wall[owners[inside]] = True
+
+                owners, indexes = grids[1].pairs(np.arange(len(rays)), cells)
+                items = self.food_array[indexes]
+                offset_x = x[owners] - items[:, 0]
+                offset_y = y[owners] - items[:, 1]
+                inside = offset_x * offset_x + offset_y * offset_y <= items[:, 2] * items[:, 2]
+                food[owners[inside]] = True
+
+            hit = wall | food
+            if hit.any():
+                hit_rays = rays[hit]
+                hit_types[hit_rays] = np.where(wall[hit], HitType.Wall.value, HitType.Food.value)
+                hit_x[hit_rays] = x[hit]
+                hit_y[hit_rays] = y[hit]
+
+                missed = ~hit
+                rays = rays[missed]
+                x = x[missed]
+                y = y[missed]
+                step_x = step_x[missed]
+                step_y = step_y[missed]
+                if len(rays) == 0:
+                    break
+
+        hit_x[rays] = x
+        hit_y[rays] = y
+        return hit_types, hit_x, hit_y
+
+    def raycast_analytic_batch(self, origin_x:np.ndarray, origin_y:np.ndarray,
+                               direction_x:np.ndarray, direction_y:np.ndarray,
+                               max_length=90) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        raycast_analytic over arrays of rays
+        """
+        grids = self.spatial_grids()
+        nearest = np.full(len(origin_x), float(max_length))
+        hit_types = np.zeros(len(origin_x), dtype=np.int8)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for value, delta, limit, sign in ((origin_x, direction_x, self.min_x, 1),
+                                              (origin_y, direction_y, self.min_y, 1),
+                                              (origin_x, direction_x, self.max_x, -1),
+                                              (origin_y, direction_y, self.max_y, -1)):
+                distance = np.where((value - limit) * sign <= 0, 0,
+                                    np.where(delta * sign < 0, (limit - value) / delta, np.inf))
+                hit = distance <= nearest
+                nearest[hit] = distance[hit]
+                hit_types[hit] = HitType.Wall.value
+
+            if grids is not None:
+                self.raycast_analytic_pairs(grids, origin_x, origin_y, direction_x, direction_y,
+                                            max_length, nearest, hit_types)
+                return hit_types, origin_x + direction_x * nearest, origin_y + direction_y * nearest
+
+            for wall in self.walls:
+                low = np.zeros(len(origin_x))
+                high = np.full(len(origin_x), np.inf)
+                for value, delta, start, end in ((origin_x, direction_x, wall.start_pos[0], wall.end_pos[0]),
+                                                 (origin_y, direction_y, wall.start_pos[1], wall.end_pos[1])):
+                    first = (start - value) / delta
+                    second = (end - value) / delta
+                    inside = (start < value) & (value < end)
+                    low = np.maximum(low, np.where(delta == 0, np.where(inside, -np.inf, np.inf),
+                                                   np.minimum(first, second)))
+                    high = np.minimum(high, np.where(delta == 0, np.where(inside, np.inf, -np.inf),
+                                                     np.maximum(first, second)))
+
+                hit = (low < high) & (low <= nearest)
+                nearest[hit] = low[hit]
+                hit_types[hit] = HitType.Wall.value
+
+            for food in self.foods:
+                offset_x = origin_x - food.position[0]
+                offset_y = origin_y - food.position[1]
+                a = direction_x * direction_x + direction_y * direction_y
+                b = 2 * (direction_x * offset_x + direction_y * offset_y)
+                c = offset_x * offset_x + offset_y * offset_y - food.radius * food.radius
+
+                discriminant = b * b - 4 * a * c
+                root = np.sqrt(np.maximum(discriminant, 0))
+                low = np.maximum((-b - root) / (2 * a), 0)
+                high = (-b + root) / (2 * a)
+
+                hit = (discriminant >= 0) & (low <= high) & (low < nearest)
+                nearest[hit] = low[hit]
+                hit_types[hit] = HitType.Food.value
+
+        return hit_types, origin_x + direction_x * nearest, origin_y + direction_y * nearest
+
+    def raycast_analytic_pairs(self, grids:Tuple[UniformGrid, UniformGrid],
+                               origin_x:np.ndarray, origin_y:np.ndarray,
+                               direction_x:np.ndarray, direction_y:np.ndarray,
+                               max_length, nearest:np.ndarray, hit_types:np.ndarray):
+        """
+        Walls and foods part of raycast_analytic_batch, only testing the
+        obstacles in the cells along each ray, a piece of about a cell at a
+        time until it has a hit. Updates nearest and hit_types in place.
+        """
+        piece = grids[0].cell_size / np.maximum(np.hypot(direction_x, direction_y), 1e-9)
+        wall_nearest = np.full(len(nearest), np.inf)
+        food_nearest = np.full(len(nearest), np.inf)
+
+        # Rays without a hit before the end of their last piece
+        active = np.arange(len(nearest))
+        start = np.zeros(len(nearest))
+        while len(active) > 0:
+            begin = start[active]
+            end = np.minimum(begin + piece[active], max_length)
+            start_x = origin_x[active] + direction_x[active] * begin
+            start_y = origin_y[active] + direction_y[active] * begin
+            end_x = origin_x[active] + direction_x[active] * end
+            end_y = origin_y[active] + direction_y[active] * end
+            boxes = np.stack((np.minimum(start_x, end_x) - 1, np.minimum(start_y, end_y) - 1,
+                              np.maximum(start_x, end_x) + 1, np.maximum(start_y, end_y) + 1), axis=1)
+            owners, cells = grids[0].box_cells(boxes)
+            owners = active[owners]
+
+            rays, indexes = grids[0].pairs(owners, cells)
+            items = self.wall_array[indexes]
+            low = np.zeros(len(rays))
+            high = np.full(len(rays), np.inf)
+            for value, delta, item_start, item_end in ((origin_x[rays], direction_x[rays], items[:, 0], items[:, 2]),
+                                                       (origin_y[rays], direction_y[rays], items[:, 1], items[:, 3])):
+                first = (item_start - value) / delta
+                second = (item_end - value) / delta
+                inside = (item_start < value) & (value < item_end)
+                low = np.maximum(low, np.where(delta == 0, np.where(inside, -np.inf, np.inf),
+                                               np.minimum(first, second)))
+                high = np.minimum(high, np.where(delta == 0, np.where(inside, np.inf, -np.inf),
+                                                 np.maximum(first, second)))
+
+            hit = low < high
+            np.minimum.at(wall_nearest, rays[hit], low[hit])
+
+            rays, indexes = grids[1].pairs(owners, cells)
+            items = self.food_array[indexes]
+            pair_x = direction_x[rays]
+            pair_y = direction_y[rays]
+            offset_x = origin_x[rays] - items[:, 0]
+            offset_y = origin_y[rays] - items[:, 1]
+            a = pair_x * pair_x + pair_y * pair_y
+            b = 2 * (pair_x * offset_x + pair_y * offset_y)
+            c = offset_x * offset_x + offset_y * offset_y - items[:, 2] * items[:, 2]
+
+            discriminant = b * b - 4 * a * c
+            root = np.sqrt(np.maximum(discriminant, 0))
+            low = np.maximum((-b - root) / (2 * a), 0)
+            high = (-b + root) / (2 * a)
+
+            hit = (discriminant >= 0) & (low <= high)
+            np.minimum.at(food_nearest, rays[hit], low[hit])
+
+            start[active] = end
+            best = np.minimum(np.minimum(nearest[active], wall_nearest[active]), food_nearest[active])
+            active = active[(best >= end) & (end < max_length)]
+
+        # The nearest wall wins ties with the borders and the nearest food
+        # has to be strictly closer, same as testing them one by one
+        hit = wall_nearest <= nearest
+        nearest[hit] = wall_nearest[hit]
+        hit_types[hit] = HitType.Wall.value
+
+        hit = food_nearest < nearest
+        nearest[hit] = food_nearest[hit]
+        hit_types[hit] = HitType.Food.value
 
     def raycast(self, position:Vector, direction:Vector, max_distance=30) -> Tuple[HitType, Vector]:
-        direction = Math.tuple_multiple(direction, 3)
+        """
+        Cast a ray of max_distance steps, returns what it hit and where
+        """
+        if self.raycast_mode == RaycastMode.Quantized:
+            return self.raycast_quantized(position, direction, max_distance)
+        if self.raycast_mode == RaycastMode.Analytic:
+            return self.raycast_analytic(position, direction, max_distance * RaycastStep)
+        return self.raycast_stepped(position, direction, max_distance)
+
+    def hit_type_at(self, position:Vector) -> HitType:
+        # Same tests in the same order as raycast_stepped
+        if position[0] <= self.min_x or position[1] <= self.min_y or\
+           position[0] >= self.max_x or position[1] >= self.max_y:
+            return HitType.Wall
+
+        walls, foods = self.obstacles_at(position)
+        for wall in walls:
+            if wall.end_pos[0] > position[0] > wall.start_pos[0]:
+                if wall.end_pos[1] > position[1] > wall.start_pos[1]:
+                    return HitType.Wall
+
+        for food in foods:
+            if Math.sqr_magnitude(position, food.position) <= food.radius * food.radius:
+                return HitType.Food
+
+        return HitType.Nothing
+
+    def first_hit_step(self, position:Vector, step:Vector, max_distance) -> int:
+        """
+        First step a stepped raycast would hit something, or None
+        """
+        candidates = [
+            first_step_at_most(position[0], step[0], self.min_x),
+            first_step_at_most(position[1], step[1], self.min_y),
+            first_step_at_most(-position[0], -step[0], -self.max_x),
+            first_step_at_most(-position[1], -step[1], -self.max_y),
+        ]
+        candidates = [k for k in candidates if k is not None]
+
+        for reach, walls, foods in self.obstacles_along(position, step, max_distance):
+            for wall in walls:
+                low_x, high_x = open_interval(position[0], step[0], wall.start_pos[0], wall.end_pos[0])
+                low_y, high_y = open_interval(position[1], step[1], wall.start_pos[1], wall.end_pos[1])
+                low = max(low_x, low_y, 0)
+                high = min(high_x, high_y)
+                if high <= low:
+                    continue
+
+                k = math.floor(low) + 1
+                if k < high:
+                    candidates.append(k)
+
+            for food in foods:
+                low, high = circle_interval(position, step, food.position, food.radius)
+                if high < low:
+                    continue
+
+                k = max(1, math.ceil(low))
+                if k <= high:
+                    candidates.append(k)
+
+            if len(candidates) > 0 and min(candidates) < reach:
+                break
+
+        candidates = [k for k in candidates if k <= max_distance]
+        if len(candidates) == 0:
+            return None
+        return min(candidates)
+
+    def raycast_quantized(self, position:Vector, direction:Vector, max_distance=30) -> Tuple[HitType, Vector]:
+        step = Math.tuple_multiple(direction, RaycastStep)
+        hit_step = self.first_hit_step(position, step, max_distance)
+
+        # Add the steps one by one like raycast_stepped, so the hit point is
+        # bit identical
+        point = previous = position
+        for _ in range(max_distance if hit_step is None else hit_step):
+            previous = point
+            point = (point[0] + step[0], point[1] + step[1])
+
+        if hit_step is None:
+            return HitType.Nothing, point
+
+        # The closed form step can be off by one when the ray grazes an edge
+        # within rounding error, march the ray in that case
+        hit_type = self.hit_type_at(point)
+        if hit_type == HitType.Nothing or (hit_step > 1 and self.hit_type_at(previous) != HitType.Nothing):
+            return self.raycast_stepped(position, direction, max_distance)
+
+        return hit_type, point
+
+    def raycast_analytic(self, position:Vector, direction:Vector, max_length=90) -> Tuple[HitType, Vector]:
+        nearest = max_length
+        hit_type = HitType.Nothing
+
+        # Borders, a ray starting past one hits it right away
+        for value, delta, limit, sign in ((position[0], direction[0], self.min_x, 1),
+                                          (position[1], direction[1], self.min_y, 1),
+                                          (position[0], direction[0], self.max_x, -1),
+                                          (position[1], direction[1], self.max_y, -1)):
+            if (value - limit) * sign <= 0:
+                distance = 0
+            elif delta * sign < 0:
+                distance = (limit - value) / delta
+            else:
+                continue
+
+            if distance <= nearest:
+                nearest = distance
+                hit_type = HitType.Wall
+
+        # The nearest wall wins ties with the borders, the nearest food has
+        # to be strictly closer than both
+        wall_nearest = food_nearest = math.inf
+        for reach, walls, foods in self.obstacles_along(position, direction, max_length):
+            for wall in walls:
+                low_x, high_x = open_interval(position[0], direction[0], wall.start_pos[0], wall.end_pos[0])
+                low_y, high_y = open_interval(position[1], direction[1], wall.start_pos[1], wall.end_pos[1])
+                low = max(low_x, low_y, 0)
+                if low < min(high_x, high_y) and low < wall_nearest:
+                    wall_nearest = low
+
+            for food in foods:
+                low, high = circle_interval(position, direction, food.position, food.radius)
+                low = max(low, 0)
+                if low <= high and low < food_nearest:
+                    food_nearest = low
+
+            if min(nearest, wall_nearest, food_nearest) < reach:
+                break
+
+        if wall_nearest <= nearest:
+            nearest = wall_nearest
+            hit_type = HitType.Wall
+        if food_nearest < nearest:
+            nearest = food_nearest
+            hit_type = HitType.Food
+
+        return hit_type, (position[0] + direction[0] * nearest,
+                          position[1] + direction[1] * nearest)
+
+    def raycast_stepped(self, position:Vector, direction:Vector, max_distance=30) -> Tuple[HitType, Vector]:
+        grids = self.spatial_grids()
+        walls = self.walls
+        foods = self.foods
+
+        direction = Math.tuple_multiple(direction, RaycastStep)
         for _ in range(max_distance):
             position = Math.tuple_plus(position, direction)
 
@@ -200,14 +1042,18 @@ class NavigationGame(NEATManagedWindow):
             if position[1] >= self.max_y:
                 return HitType.Wall, position
 
+            if grids is not None:
+                walls = grids[0].query_point(*position)
+                foods = grids[1].query_point(*position)
+
             # Check walls for raycast
-            for wall in self.walls:
+            for wall in walls:
                 if wall.end_pos[0] > position[0] > wall.start_pos[0]:
                     if wall.end_pos[1] > position[1] > wall.start_pos[1]:
                         return HitType.Wall, position
 
             # Check foods for raycast
-            for food in self.foods:
+            for food in foods:
                 if Math.sqr_magnitude(position, food.position) <= food.radius * food.radius:
                     return HitType.Food, position
 
@@ -231,8 +1077,30 @@ class NavigationGame(NEATManagedWindow):
             if self.run_pygame:
                 pygame.draw.circle(self.surface, color, food.position, food.radius, 1)
 
-        for character in self.characters:
-            character.update(delta_time=delta_time)
+        if self.advance(delta_time):
+            self.reset()
+            return
+
+        self.progress_bar.set_progress(self.time_pass)
+
+    def advance(self, delta_time: float) -> bool:
+        """
+        Play one tick, returns whether the round is over
+        """
+        if self.tick_count % self.decision_interval == 0 or self.held_results is None:
+            with self.profiler.phase("network"):
+                self.held_results = self.feed_genome_characters()
+            self.network_evaluations += len(self.characters)
+            self.profiler.count("evaluations", len(self.characters))
+        results = self.held_results
+        self.tick_count += 1
+        self.profiler.count("ticks")
+
+        for character, result in zip(self.characters, results):
+            if character.food_count >= len(self.foods):
+                continue
+
+            character.update(delta_time=delta_time, results=result)
 
             # Use AABB check to clamp character position
             x, y = character.position
@@ -255,18 +1123,18 @@ class NavigationGame(NEATManagedWindow):
                 character.food_count += 1
 
             if character.food_count >= len(self.foods):
-                self.reset()
-                return
+                if self.end_round_on_finish:
+                    return True
+
+                self.finished_count += 1
+                if self.finished_count >= len(self.characters):
+                    return True
 
             if self.run_pygame:
                 character.draw(self)
 
         self.time_pass += delta_time
-        if self.time_pass > self.time_pass_limit:
-            self.reset()
-            return
-        
-        self.progress_bar.set_progress(self.time_pass)
+        return self.time_pass > self.time_pass_limit
 
     def evaluate_character_score(self):
         max_distance = 400 * 400 + 200 * 200
@@ -281,78 +1149,225 @@ class NavigationGame(NEATManagedWindow):
             score += 1 - (distance / max_distance)
             character.score = score
 
-    def reset(self):
+    def reset(self, evaluate_scores=True):
+        """
+        Reproduce from the scores of the round, evaluate_scores is False when
+        they were already set by evaluate_arenas
+        """
         self.total_round += 1
         self.generation_round_count += 1
 
         self.progress_bar.set_progress(self.progress_bar.progress_length)
         self.time_pass = 0
+        self.tick_count = 0
+        self.finished_count = 0
+        self.held_results = None
 
-        self.evaluate_character_score()
+        if evaluate_scores:
+            self.evaluate_character_score()
         best_characters = sorted(self.characters, key=lambda character: character.score, reverse=True)
 
         # Update high score
         self.update_high_score(best_characters[0].score)
 
-        # Handle mutation
-        if self.round_since_last_high_score >= 4:
-            self.generation_count += 1
-            self.generation_round_count = 0
+        with self.profiler.phase("reproduction"):
+            # Handle mutation
+            if self.round_since_last_high_score >= 4:
+                self.generation_count += 1
+                self.generation_round_count = 0
+
+                best_characters = best_characters[:20]
+                self.round_since_last_high_score = 0
+
+                with self.profiler.phase("save"):
+                    self.save_characters(best_characters, str(self.generation_count))
 
-            best_characters = best_characters[:20]
-            self.round_since_last_high_score = 0
+                # The characters of this round keep going from where they
+                # stopped, as long as the population manager has room
+                carried = [character for character in self.characters
+                           if isinstance(character, GenomeCharacter)]
+                offspring = []
 
-            self.save_characters(best_characters, str(self.generation_count))
+                innovations.new_generation()
+                for character in best_characters:
+                    mutations = sample_mutations(character.genome, 10, -4, 4)
 
-            for character in best_characters:
-                mutations = connection_mutations(character.genome, -4, 4)
-                mutations += insert_node_mutations(character.genome)
-                mutations = random.choices(mutations, k=10)
+                    for genome in mutations:
+                        variants = connection_weight_random_add(genome, 20, -4, 4)
+                        for variant in variants:
+                            offspring.append(self.character_pool.acquire(variant, self.start_position))
 
-                for genome in mutations:
+            else:
+                best_genomes = [character.genome for character in best_characters[:20]]
+                self.character_pool.release([character for character in self.characters
+                                             if isinstance(character, GenomeCharacter)])
+                carried = []
+                offspring = []
+
+                for genome in best_genomes:
                     variants = connection_weight_random_add(genome, 20, -4, 4)
                     for variant in variants:
-                        character = GenomeCharacter(variant, (50, 100), 10)
-                        self.add_character(character=character)
+                        offspring.append(self.character_pool.acquire(variant, self.start_position))
 
-        else:
-            best_characters = best_characters[:20]
-            self.characters.clear()
+            population, retired = self.population_manager.limit(carried, offspring)
+            self.character_pool.release(retired)
+            # A spike in population size doesn't keep its characters around
+            self.character_pool.trim(len(population))
 
-            for character in best_characters:
-                variants = connection_weight_random_add(character.genome, 20, -4, 4)
-                for variant in variants:
-                    character = GenomeCharacter(variant, (50, 100), 10)
+            carried_ids = {id(character) for character in carried}
+            self.characters.clear()
+            for character in population:
+                if id(character) in carried_ids:
+                    self.characters.append(character)
+                else:
                     self.add_character(character=character)
+            self.genome_batch = None
+            self.held_results = None
+
+        if self.checkpoint_writer is not None and self.checkpoint_writer.due(self.total_round):
+            with self.profiler.phase("checkpoint"):
+                self.checkpoint_writer.save([character.genome for character in self.characters],
+                                            self.checkpoint_state())
+
+        self.profiler.end_generation(round=self.total_round, generation=self.generation_count,
+                                     high_score=self.last_high_score,
+                                     **self.population_manager.report)
+
+    def checkpoint_state(self) -> dict:
+        """
+        Everything besides the genomes needed to continue training from the
+        start of the next round
+        """
+        return {
+            "game": "navigation_2d",
+            "total_round": self.total_round,
+            "generation_count": self.generation_count,
+            "generation_round_count": self.generation_round_count,
+            "last_high_score": self.last_high_score,
+            "round_since_last_high_score": self.round_since_last_high_score,
+            "random": dump_random_state(),
+            "innovations": innovations.getstate(),
+            # Characters kept from the last round continue where they stopped
+            "characters": [[*character.position, character.rotation, character.food_count]
+                           for character in self.characters],
+        }
+
+    def restore_checkpoint(self, genomes: List[Genome], state: dict):
+        if state["game"] != "navigation_2d":
+            raise ValueError(f"Checkpoint is from {state['game']}, not navigation_2d")
+
+        self.characters.clear()
+        for genome, (x, y, rotation, food_count) in zip(genomes, state["characters"]):
+            character = self.character_pool.acquire(genome, (x, y))
+            self.add_character(character=character)
+            if rotation != 0:
+                character.rotation = rotation
+            character.food_count = food_count
+
+        self.total_round = state["total_round"]
+        self.generation_count = state["generation_count"]
+        self.generation_round_count = state["generation_round_count"]
+        self.last_high_score = state["last_high_score"]
+        self.round_since_last_high_score = state["round_since_last_high_score"]
+        load_random_state(state["random"])
+        innovations.setstate(state["innovations"])
+
+        self.time_pass = 0
+        self.tick_count = 0
+
+    def evaluate_arenas(self, delta_time: float, executor: ProcessPoolExecutor=None):
+        """
+        Play one round of every character in every arena, sharded over the
+        executor when given, and set each score to the aggregate of its
+        arena scores. Rounds are deterministic and a character's score
+        doesn't depend on its shard, so sharding doesn't change the scores.
+        """
+        if self.workers < 1:
+            raise ValueError(f"workers must be at least 1, not {self.workers}")
+
+        genomes = [character.genome for character in self.characters]
+        options = {
+            "decision_interval": self.decision_interval,
+            "raycast_mode": self.raycast_mode,
+            "batched_sensors": self.batched_sensors,
+            "spatial_index": self.spatial_index,
+        }
+
+        shards = [indexes for indexes in np.array_split(np.arange(len(genomes)), self.workers)
+                  if len(indexes) > 0]
+        jobs = [(arena_index, indexes) for arena_index in range(len(self.arenas)) for indexes in shards]
+
+        if executor is None:
+            results = [evaluate_arena_shard([genomes[i] for i in indexes], self.arenas[arena_index],
+                                            delta_time, self.time_pass_limit, options)
+                       for arena_index, indexes in jobs]
+        else:
+            futures = [executor.submit(evaluate_arena_shard, [genomes[i] for i in indexes],
+                                       self.arenas[arena_index], delta_time,
+                                       self.time_pass_limit, options)
+                       for arena_index, indexes in jobs]
+            results = [future.result() for future in futures]
+
+        scores = np.empty((len(self.arenas), len(genomes)), dtype=np.float64)
+        for (arena_index, indexes), (shard_scores, _, _) in zip(jobs, results):
+            scores[arena_index, indexes] = shard_scores
+
+        if self.arena_aggregate == FitnessAggregate.Min:
+            fitness = scores.min(axis=0)
+        else:
+            fitness = scores.mean(axis=0)
+        for character, score in zip(self.characters, fitness.tolist()):
+            character.score = score
+
+        evaluations = sum(result[2] for result in results)
+        self.network_evaluations += evaluations
+        self.profiler.count("ticks", sum(result[1] for result in results))
+        self.profiler.count("evaluations", evaluations)
+
+    def run_arenas(self):
+        delta_time = 1 / self.tick
+
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        try:
+            while True:
+                with self.profiler.phase("simulation"):
+                    self.evaluate_arenas(delta_time, executor)
+                self.reset(evaluate_scores=False)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def start(self):
+        # Arenas are only played headless by evaluate_arenas
+        if self.run_pygame and len(self.arenas) > 0:
+            raise ValueError("Arena evaluation can't run with pygame")
+        super().start()
 
     def run_without_pygame(self):
         # self.progress_bar.set_progress(0)
         delta_time = 1 / self.tick
 
+        if len(self.arenas) > 0:
+            self.run_arenas()
+            return
+
         while True:
             self.update(delta_time)
 
     def save_characters(self, characters: List[GenomeCharacter], suffix=""):
-        character_datas = []
-        for character in characters:
-            character_datas.append(character.genome.toJSON())
-
-        file_path = os.path.join(os.getcwd(), "result", f"character-{suffix}.json")
-
-        with open(file_path, "w") as f:
-            json.dump(character_datas, f, default=lambda obj: obj.toJSON(), indent=2)
+        file_path = os.path.join(os.getcwd(), "result", f"character-{suffix}.npz")
+        save_genomes(file_path, [character.genome for character in characters])
 
     def save_characters_unexpected_quit(self, number, suffix=""):
-        self.evaluate_character_score()
+        # Arena scores are from the last evaluate_arenas, the characters
+        # never played the layout of the game itself
+        if len(self.arenas) == 0:
+            self.evaluate_character_score()
         best_characters = sorted(self.characters, key=lambda character: character.score, reverse=True)
         if len(best_characters) > number:
             best_characters = best_characters[:number]
 
-        character_datas = []
-        for character in best_characters:
-            character_datas.append(character.genome.toJSON())
-
-        file_path = os.path.join(os.getcwd(), "result", f"character-{suffix}.json")
-
-        with open(file_path, "w") as f:
-            json.dump(character_datas, f, default=lambda obj: obj.toJSON(), indent=2)
+        self.save_characters(best_characters, suffix)
@@ -0,0 +1,132 @@
+import sys
+
+from enum import Enum
+from typing import Callable, List, Set, Tuple
+
+
+# Size cap when none is given, a stagnation round breeds about 2000
+# offspring in either game
+DefaultMaxPopulation = 2000
+
+
+class RetirePolicy(Enum):
+    # Retire the lowest scores first
+    Worst = 0
+    # Retire the individuals kept around the longest first
+    Oldest = 1
+
+
+def individual_bytes(individual, seen:Set[int]) -> int:
+    """
+    Estimated bytes of an entity with its genome and compiled network.
+    Genes are shared between genomes, the ones already in seen are not
+    counted again.
+    """
+    size = sys.getsizeof(individual) + sys.getsizeof(individual.__dict__)
+
+    genome = individual.genome
+    size += sys.getsizeof(genome) + sys.getsizeof(genome.nodes) + sys.getsizeof(genome.connections)
+    for gene in genome.nodes:
+        if id(gene) not in seen:
+            seen.add(id(gene))
+            size += sys.getsizeof(gene)
+    for gene in genome.connections:
+        if id(gene) not in seen:
+            seen.add(id(gene))
+            size += sys.getsizeof(gene)
+
+    network = individual.network
+    size += sys.getsizeof(network) + sys.getsizeof(network.__dict__)
+    size += sys.getsizeof(network.plan) + sys.getsizeof(network.input_indexes) +\
+        sys.getsizeof(network.output_indexes) + sys.getsizeof(network.weights) +\
+        sys.getsizeof(network.opcodes)
+    if len(network.plan) > 0:
+        size += sys.getsizeof(network.plan[0]) * len(network.plan)
+
+    return size
+
+
+class PopulationManager:
+    """
+    Keep the population under a size cap and a memory budget. Offspring are
+    kept first, in order, as far as the cap and the budget allow, then
+    individuals carried over from earlier rounds are kept by the policy
+    until the population fits. A None max_size or memory_budget is no limit.
+    At least one individual is always kept, even over the budget.
+    """
+
+    def __init__(self, max_size:int=DefaultMaxPopulation, memory_budget:int=None,
+                 policy:RetirePolicy=RetirePolicy.Worst,
+                 score:Callable=lambda individual: individual.score) -> None:
+        self.max_size = max_size
+        # Bytes as estimated by individual_bytes
+        self.memory_budget = memory_budget
+        self.policy = policy
+        self.score = score
+
+        # Size of the last population handed out, reported per generation
+        self.report = {"population": 0, "population_bytes": 0, "retired": 0, "over_budget": 0}
+
+    def limit(self, carried:List, offspring:List) -> Tuple[List, List]:
+        """
+        Returns the population, carried individuals first, and the retired
+        individuals.
+        """
+        if self.max_size is not None and len(offspring) > self.max_size:
+            retired = offspring[self.max_size:]
+            offspring = offspring[:self.max_size]
+        else:
+            retired = []
+
+        seen: Set[int] = set()
+        size = 0
+        budget_spent = False
+        for i, individual in enumerate(offspring):
+            extra = individual_bytes(individual, seen)
+            if self.memory_budget is not None and size + extra > self.memory_budget:
+                # The first one is kept anyway so there is a population left
+                if i == 0:
+                    size += extra
+                    i = 1
+                retired = offspring[i:] + retired
+                offspring = offspring[:i]
+                budget_spent = True
+                break
+            size += extra
+
+        if budget_spent:
+            # seen also holds genes of an individual nobody kept, so no
+            # carried individual could be counted right anyway
+            candidates = []
+        elif self.policy == RetirePolicy.Worst:
+            candidates = sorted(range(len(carried)),
+                                key=lambda i: self.score(carried[i]), reverse=True)
+        else:
+            candidates = list(reversed(range(len(carried))))
+
+        kept = set()
+        for i in candidates:
+            if self.max_size is not None and len(offspring) + len(kept) >= self.max_size:
+                break
+
+            # Stops at the first one over budget, so genes it marked as seen
+            # are never counted for anyone else
+            extra = individual_bytes(carried[i], seen)
+            if self.memory_budget is not None and size + extra > self.memory_budget and (offspring or kept):
+                break
+
+            size += extra
+            kept.add(i)
+
+        population = [individual for i, individual in enumerate(carried) if i in kept]
+        retired += [individual for i, individual in enumerate(carried) if i not in kept]
+        population += offspring
+
+        self.report = {
+            "population": len(population),
+            "population_bytes": size,
+            "retired": len(retired),
+            # Bytes above the budget when a lone individual does not fit
+            "over_budget": 0 if self.memory_budget is None else max(size - self.memory_budget, 0),
+        }
+        return population, retired
@@ -0,0 +1,112 @@
+import sys
+import json
+import time
+
+from contextlib import nullcontext
+from typing import Dict, TextIO
+
+
+class Phase:
+    __slots__ = ("name", "profiler", "start")
+
+    def __init__(self, name:str, profiler:"PhaseProfiler") -> None:
+        self.name = name
+        self.profiler = profiler
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.seconds[self.name] += time.perf_counter() - self.start
+        self.profiler.calls[self.name] += 1
+        return False
+
+
+class PhaseProfiler:
+    """
+    Accumulate wall time and call count per phase, and write one json line
+    per generation. Nested phases are also counted in the outer phase.
+    """
+    enabled = True
+
+    def __init__(self, output:TextIO=None) -> None:
+        self.output = output if output is not None else sys.stderr
+
+        self.phases: Dict[str, Phase] = {}
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+
+        self.generation_start = time.perf_counter()
+
+    @staticmethod
+    def open(path:str) -> "PhaseProfiler":
+        if path == "-":
+            return PhaseProfiler()
+        return PhaseProfiler(open(path, "a", buffering=1))
+
+    def phase(self, name:str) -> Phase:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name, self)
+            self.seconds[name] = 0
+            self.calls[name] = 0
+        return phase
+
+    def count(self, name:str, amount:int=1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_generation(self, **fields) -> dict:
+        """
+        Write the report of the generation, fields are added to it as is
+        """
+        now = time.perf_counter()
+        elapsed = now - self.generation_start
+
+        ticks = self.counters.get("ticks", 0)
+        evaluations = self.counters.get("evaluations", 0)
+        report = {
+            **fields,
+            "seconds": elapsed,
+            "ticks": ticks,
+            "ticks_per_sec": ticks / elapsed if elapsed > 0 else 0,
+            "evaluations": evaluations,
+            "evaluations_per_sec": evaluations / elapsed if elapsed > 0 else 0,
+            "reproduction_seconds": self.seconds.get("reproduction", 0),
+            "phases": {name: {"seconds": self.seconds[name], "calls": self.calls[name]}
+                       for name in self.phases},
+            "counters": dict(self.counters),
+        }
+        self.output.write(json.dumps(report) + "\n")
+        self.output.flush()
+
+        for name in self.phases:
+            self.seconds[name] = 0
+            self.calls[name] = 0
+        self.counters.clear()
+        self.generation_start = time.perf_counter()
+        return report
+
+
+class NullProfiler:
+    """
+    Stand in when profiling is off, every call is a no op
+    """
+    enabled = False
+
+    def __init__(self) -> None:
+        self.null_phase = nullcontext()
+
+    def phase(self, name:str):
+        return self.null_phase
+
+    def count(self, name:str, amount:int=1) -> None:
+        pass
+
+    def end_generation(self, **fields) -> dict:
+        return None
+
+
+NULL_PROFILER = NullProfiler()
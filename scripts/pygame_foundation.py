@@ -1,5 +1,6 @@
 from enum import Enum
 from typing import List, Tuple
+from .profiler import PhaseProfiler, NULL_PROFILER
 
 
 class Color:
@@ -156,6 +157,15 @@ class ManagedWindow:
         self.tick = tick
         self.tick_limit = tick_limit
 
+        # Phase timings, a no op unless enable_profiler is called
+        self.profiler = NULL_PROFILER
+
+    def enable_profiler(self, path: str="-"):
+        """
+        Write per generation phase timings as json lines to path, - is stderr
+        """
+        self.profiler = PhaseProfiler.open(path)
+
     def update(self, delta_time: float):
         pass
 
@@ -0,0 +1,107 @@
+import math
+import numpy as np
+
+from typing import List, Tuple
+
+
+# (min x, min y, max x, max y)
+Box = Tuple[float, float, float, float]
+
+
+class UniformGrid:
+    """
+    Buckets items into the cells of a uniform grid their bounding box
+    overlaps, so queries only look at the items near a point or a box.
+    Points and boxes outside the grid are clamped to the edge cells, an item
+    containing a point is always in the cell of that point.
+    """
+
+    def __init__(self, bounds:Box, cell_size:float) -> None:
+        self.min_x, self.min_y, max_x, max_y = bounds
+        self.cell_size = cell_size
+        self.columns = max(1, math.ceil((max_x - self.min_x) / cell_size))
+        self.rows = max(1, math.ceil((max_y - self.min_y) / cell_size))
+
+        self.items: list = []
+        self.cells: List[List[int]] = [[] for _ in range(self.columns * self.rows)]
+        # Items of every cell, kept alongside the indexes so point queries
+        # don't build lists
+        self.cell_items: List[list] = [[] for _ in range(self.columns * self.rows)]
+
+        # Flattened cells for array queries, built on first use
+        self.cell_starts: np.ndarray = None
+        self.cell_indexes: np.ndarray = None
+
+    def column(self, x) -> int:
+        return min(max(int((x - self.min_x) // self.cell_size), 0), self.columns - 1)
+
+    def row(self, y) -> int:
+        return min(max(int((y - self.min_y) // self.cell_size), 0), self.rows - 1)
+
+    def insert(self, item, box:Box) -> None:
+        index = len(self.items)
+        self.items.append(item)
+
+        for row in range(self.row(box[1]), self.row(box[3]) + 1):
+            for column in range(self.column(box[0]), self.column(box[2]) + 1):
+                self.cells[row * self.columns + column].append(index)
+                self.cell_items[row * self.columns + column].append(item)
+
+        self.cell_starts = None
+        self.cell_indexes = None
+
+    def query_point(self, x, y) -> list:
+        return self.cell_items[self.row(y) * self.columns + self.column(x)]
+
+    def query_box(self, box:Box) -> list:
+        """
+        Items whose cells overlap the box, each once and in insert order
+        """
+        indexes = set()
+        for row in range(self.row(box[1]), self.row(box[3]) + 1):
+            for column in range(self.column(box[0]), self.column(box[2]) + 1):
+                indexes.update(self.cells[row * self.columns + column])
+        return [self.items[index] for index in sorted(indexes)]
+
+    def cells_of(self, x:np.ndarray, y:np.ndarray) -> np.ndarray:
+        columns, rows = self.column_row_arrays(x, y)
+        return rows * self.columns + columns
+
+    def box_cells(self, boxes:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Every (box, cell) pair of an (n, 4) array of boxes
+        """
+        first_columns, first_rows = self.column_row_arrays(boxes[:, 0], boxes[:, 1])
+        last_columns, last_rows = self.column_row_arrays(boxes[:, 2], boxes[:, 3])
+
+        widths = last_columns - first_columns + 1
+        counts = widths * (last_rows - first_rows + 1)
+
+        owners = np.repeat(np.arange(len(boxes)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        columns = first_columns[owners] + offsets % widths[owners]
+        rows = first_rows[owners] + offsets // widths[owners]
+        return owners, rows * self.columns + columns
+
+    def column_row_arrays(self, x:np.ndarray, y:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        columns = np.clip(((x - self.min_x) // self.cell_size).astype(np.intp), 0, self.columns - 1)
+        rows = np.clip(((y - self.min_y) // self.cell_size).astype(np.intp), 0, self.rows - 1)
+        return columns, rows
+
+    def pairs(self, owners:np.ndarray, cells:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Expand (owner, cell) pairs into (owner, item index) pairs of every
+        item in the cells. An owner can get the same item more than once.
+        """
+        if self.cell_starts is None:
+            counts = np.asarray([len(cell) for cell in self.cells], dtype=np.intp)
+            self.cell_starts = np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+            self.cell_indexes = np.asarray([index for cell in self.cells for index in cell],
+                                           dtype=np.intp)
+
+        starts = self.cell_starts[cells]
+        counts = self.cell_starts[cells + 1] - starts
+
+        pair_owners = np.repeat(owners, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return pair_owners, self.cell_indexes[np.repeat(starts, counts) + offsets]
@@ -1,6 +1,8 @@
 import time
 import os
 
+from typing import Callable, List
+
 
 class ProgressBar:
     @staticmethod
@@ -56,6 +58,41 @@ class ProgressBar:
         #     print()
 
 
+class EntityPool:
+    """
+    Keeps released entities to rebind them to a new genome, so rebuilding
+    the population every generation reuses the same objects. At most
+    max_free entities are kept, None keeps every one.
+    """
+    def __init__(self, factory:Callable, max_free:int=None) -> None:
+        self.factory = factory
+        self.max_free = max_free
+        self.free: List = []
+
+    def acquire(self, genome, position):
+        if len(self.free) == 0:
+            return self.factory(genome, position)
+
+        entity = self.free.pop()
+        entity.rebind(genome, position)
+        return entity
+
+    def release(self, entities:List) -> None:
+        # Waiting entities don't hold on to their genome and network
+        for entity in entities:
+            entity.genome = None
+            entity.network = None
+
+        self.free.extend(entities)
+        self.trim()
+
+    def trim(self, max_free:int=None) -> None:
+        if max_free is not None:
+            self.max_free = max_free
+        if self.max_free is not None and len(self.free) > self.max_free:
+            del self.free[self.max_free:]
+
+
 if __name__ == "__main__":
     bar = ProgressBar(100, length=100)
 